@@ -0,0 +1,48 @@
+"""Adaptive scale search versus the fixed DEFAULT_SCALES list.
+
+Resizes one sheet by a range of factors, as if its symbols had been drawn
+at another size, and searches each copy for a template cut from the
+original with detect_template (DEFAULT_SCALES) and detect_adaptive
+(SCALE_RANGE). Prints time, box counts and the scales adaptive found.
+
+Usage: python benchmarks/adaptive_scales.py [page.png] [x,y,w,h] [drifts]
+"""
+import glob
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from symbolmatch.adaptive import SCALE_RANGE, detect_adaptive
+from symbolmatch.detect import DEFAULT_SCALES, detect_template
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def main():
+    pages = sorted(glob.glob(os.path.join(ROOT, "auto-img-cutter", "orginal-project-images", "*.png")))
+    page_path = sys.argv[1] if len(sys.argv) > 1 else pages[0]
+    x, y, w, h = map(int, (sys.argv[2] if len(sys.argv) > 2 else "2990,1981,27,48").split(","))
+    drifts = [float(v) for v in (sys.argv[3] if len(sys.argv) > 3 else "1.0,0.85,0.92,1.1,1.2").split(",")]
+
+    gray_img = cv2.imread(page_path, cv2.IMREAD_GRAYSCALE)
+    gray_template = gray_img[y:y + h, x:x + w].copy()
+    print(f"Template {w}x{h}; fixed scales {DEFAULT_SCALES}, adaptive range {SCALE_RANGE}")
+    print(f"{'drift':>6} {'fixed':>8} {'adaptive':>9}   boxes f/a  refined  found at")
+    for drift in drifts:
+        page = gray_img if drift == 1.0 else cv2.resize(gray_img, None, fx=drift, fy=drift)
+        started = time.perf_counter()
+        fixed, _ = detect_template(page, gray_template, 0.8, use_pyramid=False)
+        t_fixed = time.perf_counter() - started
+        stats = {}
+        started = time.perf_counter()
+        boxes, _, scales = detect_adaptive(page, gray_template, 0.8, stats=stats)
+        t_adaptive = time.perf_counter() - started
+        print(f"{drift:>6.2f} {t_fixed:7.2f}s {t_adaptive:8.2f}s   {len(fixed):>3}/{len(boxes):<3}  "
+              f"{len(stats['refined']):>7}  {sorted({round(float(s), 3) for s in scales})}")
+
+
+if __name__ == "__main__":
+    main()
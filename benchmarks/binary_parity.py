@@ -0,0 +1,66 @@
+"""Parity and cost of the bit-packed TM_BINARY method.
+
+First checks binary_ccoeff_normed against cv2.matchTemplate TM_CCOEFF_NORMED
+on the binarized page and template (they must agree to float rounding,
+TOLERANCE; the script exits with an error otherwise), then runs detect_template with TM_BINARY and with gray TM_CCOEFF_NORMED
+and reports time, the boxes both find, and the bytes each search reads.
+
+Usage: python benchmarks/binary_parity.py [page.png] [x,y,w,h]
+"""
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from symbolmatch.binary import TM_BINARY, binarize, binary_ccoeff_normed, pack_rows
+from symbolmatch.detect import detect_template
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# float32 rounding of the two score computations stays well below this
+TOLERANCE = 1e-5
+
+
+def timed(gray_img, gray_template, method, use_pyramid):
+    started = time.perf_counter()
+    boxes, _ = detect_template(gray_img, gray_template, 0.8, use_pyramid=use_pyramid, method=method)
+    return time.perf_counter() - started, {tuple(int(v) for v in b) for b in boxes}
+
+
+def main():
+    pages = sorted(glob.glob(os.path.join(ROOT, "auto-img-cutter", "orginal-project-images", "*.png")))
+    page_path = sys.argv[1] if len(sys.argv) > 1 else pages[0]
+    x, y, w, h = map(int, (sys.argv[2] if len(sys.argv) > 2 else "2990,1981,27,48").split(","))
+
+    page = cv2.imread(page_path)
+    gray_img = cv2.cvtColor(page, cv2.COLOR_BGR2GRAY)
+    gray_template = gray_img[y:y + h, x:x + w].copy()
+    print(f"Page {gray_img.shape[1]}x{gray_img.shape[0]}, template {w}x{h} at {x},{y}")
+
+    strip = gray_img[max(0, y - 500):y + 500]
+    expected = cv2.matchTemplate(binarize(strip), binarize(gray_template), cv2.TM_CCOEFF_NORMED)
+    got = binary_ccoeff_normed(strip, gray_template)
+    # OpenCV leaves all-paper windows at 1 or NaN; binary scores them 0
+    defined = np.abs(expected) <= 1.0 + 1e-4
+    diff = np.abs(got - expected)[defined].max()
+    print(f"Score map vs binarized TM_CCOEFF_NORMED: max |diff| {diff:.2e}")
+    if not diff <= TOLERANCE:
+        sys.exit(f"Score maps differ by more than {TOLERANCE:.0e}")
+
+    print(f"{'search':>12} {'gray':>8} {'binary':>8}   boxes gray/binary/both")
+    for use_pyramid in (False, True):
+        t_gray, gray_boxes = timed(gray_img, gray_template, cv2.TM_CCOEFF_NORMED, use_pyramid)
+        t_bin, bin_boxes = timed(gray_img, gray_template, TM_BINARY, use_pyramid)
+        name = "pyramid" if use_pyramid else "brute-force"
+        print(f"{name:>12} {t_gray:7.2f}s {t_bin:7.2f}s   {len(gray_boxes)}/{len(bin_boxes)}/{len(gray_boxes & bin_boxes)}")
+
+    packed = pack_rows(binarize(gray_img))
+    print(f"Page bytes: BGR {page.nbytes / 1e6:.1f} MB, gray {gray_img.nbytes / 1e6:.1f} MB, "
+          f"packed {packed.nbytes / 1e6:.1f} MB ({page.nbytes / packed.nbytes:.0f}x smaller than BGR)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Per-stage time and candidate counts of the cascade against full-page template search.
+
+The densest inked square of a page crop is the template; copies of it,
+rotated and scaled, are pasted along the bottom of the crop. The page's
+SIFT features are detected once beforehand, as the viewer's background
+SceneFeatures does, so the cascade's own stages are what is timed.
+
+Usage: python benchmarks/cascade.py [page.png] [side]
+"""
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from symbolmatch.cascade import cascade_match
+from symbolmatch.detect import detect_template
+from symbolmatch.ink import DARK
+from symbolmatch.page_cache import PageCache
+from symbolmatch.scene_features import TILE, create_detector, keypoint_geometry
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CROP = (4000, 3000)
+# (angle in degrees, scale) of every pasted copy
+POSES = ((0, 1.0), (30, 1.0), (90, 1.0), (0, 1.2), (45, 0.9))
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def main():
+    pages = sorted(glob.glob(os.path.join(ROOT, "auto-img-cutter", "orginal-project-images", "*.png")))
+    page_path = sys.argv[1] if len(sys.argv) > 1 else pages[0]
+    side = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+
+    gray_img = cv2.imread(page_path, cv2.IMREAD_GRAYSCALE)
+    h, w = gray_img.shape
+    page = gray_img[h // 4:h // 4 + CROP[1], w // 4:w // 4 + CROP[0]].copy()
+    ink = cv2.boxFilter((page < DARK).astype(np.float32), -1, (side, side), normalize=False)
+    half = side // 2
+    y, x = np.unravel_index(ink[half:-half, half:-half].argmax(), (page.shape[0] - side, page.shape[1] - side))
+    gray_template = page[y:y + side, x:x + side].copy()
+    print(f"Template {side}x{side} at {x},{y}")
+    for i, (angle, scale) in enumerate(POSES):
+        size = int(side * scale * 1.5)
+        matrix = cv2.getRotationMatrix2D((side / 2, side / 2), angle, scale)
+        matrix[:, 2] += (size - side) / 2
+        px, py = 200 + i * 3 * side, page.shape[0] - 2 * side - size
+        page[py:py + size, px:px + size] = cv2.warpAffine(gray_template, matrix, (size, size), borderValue=255)
+        print(f"  copy at {px},{py} rotated {angle} scaled {scale}")
+
+    t_features, (keypoints, descriptors) = timed(
+        lambda: create_detector("sift", 0, TILE).detectAndCompute(page, None))
+    scene = keypoint_geometry(keypoints), descriptors
+    print(f"Page SIFT: {len(keypoints)} keypoints in {t_features:.2f}s (precomputed)")
+
+    stats = {}
+    t_cascade, (boxes, scores) = timed(lambda: cascade_match(page, gray_template, 0.7, scene=scene,
+                                                             cache=PageCache(page), stats=stats))
+    seconds = stats.pop("seconds")
+    print(f"cascade    {t_cascade:.3f}s  {len(boxes)} boxes  "
+          + "  ".join(f"{stage} {t:.3f}s" for stage, t in seconds.items()))
+    print("  " + ", ".join(f"{k} {v:.2%}" if k == "correlated" else f"{k} {v}" for k, v in stats.items()))
+    for box, score in zip(boxes, scores):
+        print(f"  {tuple(int(v) for v in box)} {score:.3f}")
+
+    t_full, (boxes, scores) = timed(lambda: detect_template(page, gray_template, 0.7))
+    print(f"full page  {t_full:.3f}s  {len(boxes)} boxes")
+    for box, score in zip(boxes, scores):
+        print(f"  {tuple(int(v) for v in box)} {score:.3f}")
+
+
+if __name__ == "__main__":
+    main()
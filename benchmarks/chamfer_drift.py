@@ -0,0 +1,50 @@
+"""Chamfer versus correlation when symbols are drawn at a slightly different size.
+
+Resizes one sheet by a few percent, as if it had been plotted at another
+scale, and searches it for a template cut from the original sheet with the
+spatial backend (DEFAULT_SCALES) and the chamfer backend (which searches
+fewer scales, see chamfer_scales). Prints time and box count per drift.
+
+Usage: python benchmarks/chamfer_drift.py [page.png] [x,y,w,h] [drifts]
+"""
+import glob
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from symbolmatch.chamfer import chamfer_scales
+from symbolmatch.detect import DEFAULT_SCALES, detect_template
+from symbolmatch.ink import InkMap
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def timed(gray_img, gray_template, backend):
+    started = time.perf_counter()
+    boxes, _ = detect_template(gray_img, gray_template, 0.8, use_pyramid=False, backend=backend,
+                               ink=InkMap(gray_img))
+    return time.perf_counter() - started, len(boxes)
+
+
+def main():
+    pages = sorted(glob.glob(os.path.join(ROOT, "auto-img-cutter", "orginal-project-images", "*.png")))
+    page_path = sys.argv[1] if len(sys.argv) > 1 else pages[0]
+    x, y, w, h = map(int, (sys.argv[2] if len(sys.argv) > 2 else "2990,1981,27,48").split(","))
+    drifts = [float(v) for v in (sys.argv[3] if len(sys.argv) > 3 else "1.0,0.95,1.05,0.92,1.08").split(",")]
+
+    gray_img = cv2.imread(page_path, cv2.IMREAD_GRAYSCALE)
+    gray_template = gray_img[y:y + h, x:x + w].copy()
+    print(f"Template {w}x{h}; spatial scales {DEFAULT_SCALES}, chamfer scales {chamfer_scales(DEFAULT_SCALES)}")
+    print(f"{'drift':>6} {'spatial':>9} {'chamfer':>9}   boxes s/c")
+    for drift in drifts:
+        page = gray_img if drift == 1.0 else cv2.resize(gray_img, None, fx=drift, fy=drift)
+        t_spatial, n_spatial = timed(page, gray_template, "spatial")
+        t_chamfer, n_chamfer = timed(page, gray_template, "chamfer")
+        print(f"{drift:>6.2f} {t_spatial:8.2f}s {t_chamfer:8.2f}s   {n_spatial}/{n_chamfer}")
+
+
+if __name__ == "__main__":
+    main()
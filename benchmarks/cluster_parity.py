@@ -0,0 +1,56 @@
+"""Parity and speed of symbolmatch.cluster.dbscan against scikit-learn's DBSCAN.
+
+Random point sets (clustered, rounded to pixels, with uniform noise) must
+get identical labels. scikit-learn is only needed for this comparison.
+
+Usage: python benchmarks/cluster_parity.py [trials]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from symbolmatch.cluster import dbscan
+
+try:
+    from sklearn.cluster import DBSCAN
+except ImportError:
+    sys.exit("scikit-learn is needed to compare against")
+
+
+def timed(fn):
+    started = time.perf_counter()
+    labels = fn()
+    return time.perf_counter() - started, labels
+
+
+def main():
+    trials = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    rng = np.random.default_rng(0)
+    different = 0
+    for trial in range(trials):
+        n = int(rng.integers(1, 400))
+        centers = rng.uniform(0, 2000, (int(rng.integers(1, 20)), 2))
+        points = centers[rng.integers(0, len(centers), n)] + rng.normal(0, rng.uniform(3, 40), (n, 2))
+        if trial % 3 == 0:
+            points = np.round(points)
+        if trial % 5 == 0:
+            points = np.vstack([points, rng.uniform(0, 2000, (50, 2))])
+        eps, min_samples = float(rng.choice([0.5, 5, 10, 25, 40])), int(rng.integers(1, 8))
+        ref = DBSCAN(eps=eps, min_samples=min_samples).fit(points).labels_
+        different += not np.array_equal(ref, dbscan(points, eps, min_samples))
+    print(f"{trials} random sets: {'identical' if not different else f'{different} DIFFERENT'}")
+
+    for n in (1000, 10000, 100000):
+        centers = rng.uniform(0, 9600, (max(1, n // 20), 2))
+        points = (centers[rng.integers(0, len(centers), n)] + rng.normal(0, 10, (n, 2))).astype(np.float32)
+        t_sk, ref = timed(lambda: DBSCAN(eps=25, min_samples=3).fit(points).labels_)
+        t_grid, got = timed(lambda: dbscan(points, 25, 3))
+        print(f"{n:>6} points  sklearn {t_sk:.3f}s  grid {t_grid:.3f}s  "
+              f"{'identical' if np.array_equal(ref, got) else 'DIFFERENT'}")
+
+
+if __name__ == "__main__":
+    main()
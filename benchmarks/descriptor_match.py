@@ -0,0 +1,63 @@
+"""Parity and speed of descriptor_match against BFMatcher on real page features.
+
+The densest inked square of the page is the template. Both the ratio test
+(knnMatch k=2) and cross-checked matching must return the same
+(query, train) pairs as OpenCV's brute-force matcher.
+
+Usage: python benchmarks/descriptor_match.py [page.png] [side]
+"""
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from symbolmatch.descriptor_match import match_descriptors
+from symbolmatch.ink import DARK
+from symbolmatch.scene_features import TiledDetector, create_detector
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def timed(fn):
+    started = time.perf_counter()
+    pairs = fn()
+    return time.perf_counter() - started, pairs
+
+
+def main():
+    pages = sorted(glob.glob(os.path.join(ROOT, "auto-img-cutter", "orginal-project-images", "*.png")))
+    page_path = sys.argv[1] if len(sys.argv) > 1 else pages[0]
+    side = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+    gray_img = cv2.imread(page_path, cv2.IMREAD_GRAYSCALE)
+    ink = cv2.boxFilter((gray_img < DARK).astype(np.float32), -1, (side, side), normalize=False)
+    half = side // 2
+    y, x = np.unravel_index(ink[half:-half, half:-half].argmax(), (gray_img.shape[0] - side, gray_img.shape[1] - side))
+    gray_template = gray_img[y:y + side, x:x + side]
+    print(f"Template {side}x{side} at {x},{y}")
+
+    for kind, norm in (("sift", cv2.NORM_L2), ("orb", cv2.NORM_HAMMING)):
+        _, des_img = TiledDetector(kind, 0).detectAndCompute(gray_img, None)
+        _, des_tpl = create_detector(kind, 5000 if kind == "orb" else 0).detectAndCompute(gray_template, None)
+        print(f"{kind}: {len(des_tpl)} template x {len(des_img)} page descriptors")
+
+        t_bf, ref = timed(lambda: {(a.queryIdx, a.trainIdx) for a, b in
+                                   cv2.BFMatcher(norm).knnMatch(des_tpl, des_img, k=2) if a.distance < 0.75 * b.distance})
+        t_np, got = timed(lambda: set(zip(*(a.tolist() for a in match_descriptors(des_tpl, des_img, 0.75)[:2]))))
+        print(f"  ratio 0.75  BFMatcher {t_bf:.3f}s  arrays {t_np:.3f}s  {len(ref)}/{len(got)} matches, "
+              f"{'identical' if ref == got else 'DIFFERENT'}")
+
+        t_bf, ref = timed(lambda: {(m.queryIdx, m.trainIdx) for m in
+                                   cv2.BFMatcher(norm, crossCheck=True).match(des_tpl, des_img)})
+        t_np, got = timed(lambda: set(zip(*(a.tolist() for a in
+                                            match_descriptors(des_tpl, des_img, None, cross_check=True)[:2]))))
+        print(f"  crossCheck  BFMatcher {t_bf:.3f}s  arrays {t_np:.3f}s  {len(ref)}/{len(got)} matches, "
+              f"{'identical' if ref == got else 'DIFFERENT'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Spatial versus FFT correlation as the template grows.
+
+Times collect_candidates on one sheet with the brute-force spatial search,
+the pyramid search and the overlap-save FFT backend, for square templates
+cut from the page at increasing sizes, and prints the sizes where FFT wins.
+FFT_AREA_RANGE in symbolmatch.detect is set from this table.
+
+Usage: python benchmarks/fft_crossover.py [page.png] [x,y] [sizes]
+"""
+import glob
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from symbolmatch.detect import DEFAULT_SCALES, collect_candidates
+from symbolmatch.parallel import default_workers
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def timed(gray_img, gray_template, use_pyramid, backend):
+    started = time.perf_counter()
+    _, scores = collect_candidates(gray_img, gray_template, 0.8, DEFAULT_SCALES, use_pyramid, backend=backend)
+    return time.perf_counter() - started, len(scores)
+
+
+def main():
+    pages = sorted(glob.glob(os.path.join(ROOT, "auto-img-cutter", "orginal-project-images", "*.png")))
+    page_path = sys.argv[1] if len(sys.argv) > 1 else pages[0]
+    x, y = map(int, (sys.argv[2] if len(sys.argv) > 2 else "3000,2000").split(","))
+    sizes = [int(v) for v in (sys.argv[3] if len(sys.argv) > 3 else "32,64,96,128,192,256,384").split(",")]
+
+    gray_img = cv2.imread(page_path, cv2.IMREAD_GRAYSCALE)
+    print(f"Page {gray_img.shape[1]}x{gray_img.shape[0]}, scales {DEFAULT_SCALES}, workers {default_workers()}")
+    print(f"{'template':>10} {'spatial':>9} {'pyramid':>9} {'fft':>9}   peaks s/p/f")
+
+    wins = {"spatial": [], "pyramid": []}
+    for side in sizes:
+        gray_template = gray_img[y:y + side, x:x + side].copy()
+        t_spatial, n_spatial = timed(gray_img, gray_template, False, "spatial")
+        t_pyramid, n_pyramid = timed(gray_img, gray_template, True, "spatial")
+        t_fft, n_fft = timed(gray_img, gray_template, False, "fft")
+        print(f"{side:>4}x{side:<5} {t_spatial:8.2f}s {t_pyramid:8.2f}s {t_fft:8.2f}s   {n_spatial}/{n_pyramid}/{n_fft}")
+        if t_fft < t_spatial:
+            wins["spatial"].append(side)
+        if t_fft < t_pyramid:
+            wins["pyramid"].append(side)
+
+    for name, sides in wins.items():
+        print(f"FFT beats {name} at template sides: {', '.join(map(str, sides)) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Scaling of the strip-parallel matcher from 1 to N worker threads, and its agreement with one call.
+
+Before timing, match_tiled on small strips is compared with match_full on
+the top of the page at a low threshold, where plateaus make near-ties
+common. After suppress_near, every detection of either run must have one
+in the other within the suppression distance and SCORE_TOLERANCE of its
+score; the script exits with an error otherwise.
+
+Usage: python benchmarks/parallel_match.py [page.png] [x,y,w,h]
+"""
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from symbolmatch.nms import suppress_near
+from symbolmatch.parallel import default_workers, match_tiled
+from symbolmatch.pyramid import match_full
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Strip and full-page scores differ by float summation order only
+SCORE_TOLERANCE = 1e-3
+
+
+def detections(peaks, w, h):
+    """suppress_near de-duplicated (boxes, scores) of (xs, ys, scores) peaks, best first."""
+    xs, ys, scores = peaks
+    order = np.argsort(-scores, kind="stable")
+    boxes = np.column_stack([xs, ys, np.full(len(xs), w), np.full(len(xs), h)])[order]
+    keep = suppress_near(boxes, scores[order])
+    return boxes[keep], scores[order][keep]
+
+
+def unmatched(boxes, scores, other_boxes, other_scores, frac=0.5):
+    """Detections with no counterpart in the other run within frac * (w, h) and SCORE_TOLERANCE."""
+    missing = []
+    for box, score in zip(boxes, scores):
+        near = (np.abs(other_boxes[:, 0] - box[0]) < frac * box[2]) \
+            & (np.abs(other_boxes[:, 1] - box[1]) < frac * box[3]) \
+            & (np.abs(other_scores - score) <= SCORE_TOLERANCE)
+        if not near.any():
+            missing.append(tuple(int(v) for v in box[:2]))
+    return missing
+
+
+def check_parity(gray_img, gray_template, threshold=0.5, peak_radius=3, rows=3000):
+    page = gray_img[:rows]
+    h, w = gray_template.shape[:2]
+    full = detections(match_full(page, gray_template, threshold, peak_radius=peak_radius), w, h)
+    tiled = detections(match_tiled(page, gray_template, threshold, peak_radius=peak_radius, workers=4,
+                                   strip_rows=256), w, h)
+    lost = unmatched(*full, *tiled)
+    added = unmatched(*tiled, *full)
+    print(f"Parity at {threshold}: {len(full[0])} full-page / {len(tiled[0])} tiled detections, "
+          f"{len(lost)} lost, {len(added)} added")
+    if lost or added:
+        sys.exit(f"Tiled detections differ from a full-page run: lost {lost[:5]}, added {added[:5]}")
+
+
+def main():
+    pages = sorted(glob.glob(os.path.join(ROOT, "auto-img-cutter", "orginal-project-images", "*.png")))
+    page_path = sys.argv[1] if len(sys.argv) > 1 else pages[0]
+    x, y, w, h = map(int, (sys.argv[2] if len(sys.argv) > 2 else "3000,2000,70,60").split(","))
+
+    gray_img = cv2.imread(page_path, cv2.IMREAD_GRAYSCALE)
+    gray_template = gray_img[y:y + h, x:x + w].copy()
+    print(f"Page {gray_img.shape[1]}x{gray_img.shape[0]}, template {w}x{h}, OpenCV threads: {cv2.getNumThreads()}")
+    check_parity(gray_img, gray_template)
+
+    counts = sorted({1, 2, 4, 8, default_workers()})
+    counts = [n for n in counts if n <= default_workers()]
+    baseline = None
+    for workers in counts:
+        started = time.perf_counter()
+        xs, _, _ = match_tiled(gray_img, gray_template, 0.8, workers=workers)
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        print(f"workers={workers:<3} {elapsed:7.3f}s  speedup x{baseline / elapsed:4.2f}  peaks={len(xs)}")
+
+
+if __name__ == "__main__":
+    main()
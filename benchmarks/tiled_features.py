@@ -0,0 +1,64 @@
+"""Time, memory and coverage of tiled against single-call keypoint extraction.
+
+Coverage counts the inked 512-pixel cells of the page that hold at least
+one keypoint. Whole-page SIFT on a full 70 MP sheet needs more memory than
+most laptops have, so the single-call run can be limited to a crop.
+
+Usage: python benchmarks/tiled_features.py [page.png] [sift|orb] [nfeatures] [crop_w,crop_h]
+"""
+import glob
+import os
+import resource
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from symbolmatch.ink import DARK
+from symbolmatch.scene_features import TiledDetector, create_detector
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CELL = 512
+
+
+def coverage(keypoints, gray_img):
+    rows, cols = -(-gray_img.shape[0] // CELL), -(-gray_img.shape[1] // CELL)
+    hit = np.zeros((rows, cols), bool)
+    for kp in keypoints:
+        hit[int(kp.pt[1]) // CELL, int(kp.pt[0]) // CELL] = True
+    inked = np.array([[np.count_nonzero(gray_img[y:y + CELL, x:x + CELL] < DARK) > CELL
+                       for x in range(0, gray_img.shape[1], CELL)] for y in range(0, gray_img.shape[0], CELL)])
+    return np.count_nonzero(hit & inked), np.count_nonzero(inked)
+
+
+def run(name, detector, gray_img):
+    started = time.perf_counter()
+    keypoints, _ = detector.detectAndCompute(gray_img, None)
+    elapsed = time.perf_counter() - started
+    covered, inked = coverage(keypoints, gray_img)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    print(f"{name:>8} {len(keypoints):7d} keypoints {elapsed:6.2f}s  {covered}/{inked} inked cells  "
+          f"peak RSS {peak} MB")
+
+
+def main():
+    pages = sorted(glob.glob(os.path.join(ROOT, "auto-img-cutter", "orginal-project-images", "*.png")))
+    page_path = sys.argv[1] if len(sys.argv) > 1 else pages[0]
+    kind = sys.argv[2] if len(sys.argv) > 2 else "sift"
+    nfeatures = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+    crop_w, crop_h = map(int, (sys.argv[4] if len(sys.argv) > 4 else "3200,2400").split(","))
+
+    gray_img = cv2.imread(page_path, cv2.IMREAD_GRAYSCALE)
+    crop = gray_img[:crop_h, :crop_w]
+    print(f"{kind} with nfeatures={nfeatures}; crop {crop.shape[1]}x{crop.shape[0]}")
+    # Tiled first, so the peak RSS it reports is its own
+    run("tiled", TiledDetector(kind, nfeatures), crop)
+    run("single", create_detector(kind, nfeatures), crop)
+    print(f"Whole page {gray_img.shape[1]}x{gray_img.shape[0]}")
+    run("tiled", TiledDetector(kind, nfeatures), gray_img)
+
+
+if __name__ == "__main__":
+    main()
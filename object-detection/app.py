@@ -1,6 +1,6 @@
+import os
 import sys
 import cv2
-import numpy as np
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QFileDialog,
     QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QProgressDialog
@@ -8,9 +8,18 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor, QPen
 from PyQt5.QtCore import Qt, QRectF
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from symbolmatch.adaptive import SCALE_RANGE
+from symbolmatch.binary import TM_BINARY
+from symbolmatch.ink import saved_seconds
+from symbolmatch.page_cache import PageCache
+from symbolmatch.qt_worker import DetectionWorker
+from symbolmatch.result_cache import ResultCache
+
 
 class ImageViewer(QGraphicsView):
-    def __init__(self):
+    def __init__(self, use_pyramid=True, use_proposals=False, use_binary=False, backend="auto",
+                 scale_range=None):
         super().__init__()
         self.scene = QGraphicsScene()
         self.setScene(self.scene)
@@ -30,9 +39,42 @@ class ImageViewer(QGraphicsView):
         self._pan = False
         self._start_pan_pos = None
 
+        # Coarse-to-fine search; False falls back to full-page matchTemplate
+        self._use_pyramid = use_pyramid
+        # Verify only around ink blobs shaped like the selection (sparse symbols)
+        self._use_proposals = use_proposals
+        # Score 1-bit ink masks instead of gray levels (clean line drawings)
+        self._use_binary = use_binary
+        # "chamfer" tolerates symbols drawn slightly larger or smaller than the selection
+        self._backend = backend
+        # (lo, hi) to search every scale in the range adaptively instead of 1.0, 0.95 and 1.05
+        self._scale_range = scale_range
+
+        self._page_cache = None
+        # Detections persisted across sessions, keyed by page/template pixels and parameters
+        self._result_cache = ResultCache()
+        self._worker = None
+        self._pending = []
+        self._progress = None
+
         self.setRenderHint(QPainter.Antialiasing)
         self.setDragMode(QGraphicsView.NoDrag)
 
+    def set_pyramid_search(self, enabled):
+        self._use_pyramid = enabled
+
+    def set_proposal_search(self, enabled):
+        self._use_proposals = enabled
+
+    def set_binary_matching(self, enabled):
+        self._use_binary = enabled
+
+    def set_backend(self, backend):
+        self._backend = backend
+
+    def set_scale_range(self, scale_range):
+        self._scale_range = scale_range
+
     def wheelEvent(self, event):
         if event.modifiers() & Qt.ControlModifier:
             zoom_in_factor = 2.25
@@ -62,8 +104,11 @@ class ImageViewer(QGraphicsView):
             self.scale(factor, factor)
 
     def load_image(self, path):
+        self.cancel_detection()
         self._image = cv2.imread(path)
         self._clone = self._image.copy()
+        # Derived images (gray, pyramid, integrals) for this page only
+        self._page_cache = PageCache(self._clone)
         h, w, ch = self._image.shape
         q_img = QImage(self._image.data, w, h, ch * w, QImage.Format_BGR888)
         pixmap = QPixmap.fromImage(q_img)
@@ -119,55 +164,98 @@ class ImageViewer(QGraphicsView):
         super().mouseReleaseEvent(event)
 
     def detect_objects(self, box):
-        progress = QProgressDialog("Detecting similar objects...", None, 0, 0)
-        progress.setWindowTitle("Please wait")
-        progress.setWindowModality(Qt.ApplicationModal)
-        progress.setCancelButton(None)
-        progress.show()
-        QApplication.processEvents()
-
-        x, y, w, h = box
-        template = self._clone[y:y + h, x:x + w]
-        gray_img = cv2.cvtColor(self._clone, cv2.COLOR_BGR2GRAY)
-        gray_template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-
-        h_temp, w_temp = gray_template.shape
-        threshold = 0.8
-        all_matches = []
-
-        for scale in [1.0, 0.95, 1.05]:
-            resized_template = cv2.resize(gray_template, None, fx=scale, fy=scale)
-            r_h, r_w = resized_template.shape
-            if r_h >= gray_img.shape[0] or r_w >= gray_img.shape[1]:
-                continue
-
-            result = cv2.matchTemplate(gray_img, resized_template, cv2.TM_CCOEFF_NORMED)
-            loc = np.where(result >= threshold)
-            for pt in zip(*loc[::-1]):
-                all_matches.append((pt[0], pt[1], r_w, r_h))
-
-        final_boxes = []
-        for new_box in all_matches:
-            x1, y1, w1, h1 = new_box
-            overlap = False
-            for fb in final_boxes:
-                x2, y2, w2, h2 = fb
-                if abs(x1 - x2) < w1 * 0.5 and abs(y1 - y2) < h1 * 0.5:
-                    overlap = True
-                    break
-            if not overlap:
-                final_boxes.append(new_box)
-
+        # Selections made while a search is running are queued behind it
+        self._pending.append(box)
+        if self._worker is None:
+            self._start_next_detection()
+        else:
+            self._update_progress_label()
+
+    def cancel_detection(self):
+        self._pending.clear()
+        if self._worker is not None:
+            self._worker.cancel()
+
+    def _start_next_detection(self):
+        box = self._pending.pop(0)
+        self._worker = DetectionWorker(self._page_cache, box, 0.8, self._use_pyramid,
+                                       result_cache=self._result_cache, proposals=self._use_proposals,
+                                       method=TM_BINARY if self._use_binary else cv2.TM_CCOEFF_NORMED,
+                                       backend=self._backend, scale_range=self._scale_range, parent=self)
+        self._worker.progress.connect(self._on_detection_progress)
+        self._worker.found.connect(self._on_detection_found)
+        self._worker.cancelled.connect(lambda b: print(f"⛔ Detection cancelled: {b}"))
+        self._worker.failed.connect(lambda b, e: print(f"❌ Detection failed for {b}: {e}"))
+        self._worker.finished.connect(self._on_detection_finished)
+
+        if self._progress is None:
+            self._progress = QProgressDialog("Detecting similar objects...", "Cancel", 0, 0, self)
+            self._progress.setWindowTitle("Please wait")
+            self._progress.setWindowModality(Qt.NonModal)
+            self._progress.setMinimumDuration(0)
+            self._progress.setAutoClose(False)
+            self._progress.setAutoReset(False)
+            self._progress.canceled.connect(self.cancel_detection)
+        self._progress.setRange(0, 0)
+        self._update_progress_label()
+        self._progress.show()
+        self._worker.start()
+
+    def _update_progress_label(self):
+        if self._progress is not None:
+            queued = f" ({len(self._pending)} queued)" if self._pending else ""
+            self._progress.setLabelText(f"Detecting similar objects...{queued}")
+
+    def _on_detection_progress(self, done, total):
+        if self._progress is not None:
+            self._progress.setRange(0, total)
+            self._progress.setValue(done)
+
+    def _on_detection_found(self, box, final_boxes, elapsed):
+        if self._worker is None or self._worker.is_cancelled():
+            return
         color = QColor.fromHsv((self._object_id * 60) % 360, 255, 255)
         self._object_colors[self._object_id] = color
         for b in final_boxes:
             self._boxes.append((b, self._object_id))
 
-        print(f"✅ Detected: {len(final_boxes)} objects")
+        stats = self._result_cache.stats()
+        print(f"💾 Result cache: {stats['hits']} hits, {stats['misses']} misses, {stats['bytes'] / 1e6:.1f} MB")
+        ink = self._worker.ink_stats()
+        if ink is not None and ink["total"]:
+            saved = saved_seconds(elapsed, ink["skipped"])
+            print(f"🧹 Blank paper skipped: {ink['skipped']:.0%} of the page (~{saved:.2f}s saved)")
+        mode = "pyramid" if self._use_pyramid else "brute-force"
+        proposals = self._worker.proposal_stats
+        if proposals.get("fallback"):
+            print("🔎 No free-standing blob in the selection; searched the whole page")
+        elif proposals:
+            mode = "proposals"
+            print(f"🔎 Proposals: {proposals['blobs']} blobs -> {proposals['proposals']} candidates -> "
+                  f"{proposals['windows']} windows verified ({proposals['correlated']:.2%} of the page)")
+        if self._use_binary:
+            mode += ", binary"
+        if self._backend != "auto":
+            mode += f", {self._backend}"
+        adaptive = self._worker.adaptive_stats
+        if self._scale_range is not None:
+            mode = "adaptive"
+            found = sorted(set(self._worker.found_scales))
+            print(f"📏 Scales: probed {len(adaptive.get('probes', []))}, refined {len(adaptive.get('refined', []))} "
+                  f"({adaptive.get('spent', 0.0):.2f} passes), found at {found}")
+        print(f"✅ Detected: {len(final_boxes)} objects ({mode}, {elapsed:.2f}s)")
         self._object_id += 1
-        progress.close()
         self.update()
 
+    def _on_detection_finished(self):
+        self._worker.deleteLater()
+        self._worker = None
+        if self._pending:
+            self._start_next_detection()
+        elif self._progress is not None:
+            self._progress.close()
+            self._progress = None
+
     def drawForeground(self, painter, rect):
         painter.setRenderHint(QPainter.Antialiasing)
         if self._drawing and self._start and self._end:
@@ -181,9 +269,10 @@ class ImageViewer(QGraphicsView):
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, use_pyramid=True, use_proposals=False, use_binary=False, backend="auto",
+                 scale_range=None):
         super().__init__()
-        self.viewer = ImageViewer()
+        self.viewer = ImageViewer(use_pyramid, use_proposals, use_binary, backend, scale_range)
         self.setCentralWidget(self.viewer)
         self.setWindowTitle("Smart Object Detection")
         self.resize(1200, 800)
@@ -197,7 +286,14 @@ class MainWindow(QMainWindow):
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    win = MainWindow()
+    # Run with --brute-force to compare against the full-resolution search,
+    # --proposals to verify only around blobs shaped like the selection,
+    # --binary to score 1-bit ink masks instead of gray levels,
+    # --chamfer to tolerate small size and stroke-width differences,
+    # or --adaptive to find the symbol anywhere between 0.8x and 1.25x
+    win = MainWindow(use_pyramid="--brute-force" not in sys.argv, use_proposals="--proposals" in sys.argv,
+                     use_binary="--binary" in sys.argv, backend="chamfer" if "--chamfer" in sys.argv else "auto",
+                     scale_range=SCALE_RANGE if "--adaptive" in sys.argv else None)
     win.show()
     sys.exit(app.exec_())
 
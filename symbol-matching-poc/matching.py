@@ -303,9 +303,9 @@
 
 
 
+import os
 import sys
 import cv2
-import numpy as np
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QFileDialog, QGraphicsView, QGraphicsScene,
     QGraphicsPixmapItem, QProgressDialog, QToolBar, QAction, QSlider, QLabel,
@@ -314,6 +314,13 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor, QPen
 from PyQt5.QtCore import Qt, QRectF
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from symbolmatch.detect import filter_candidates
+from symbolmatch.ink import saved_seconds
+from symbolmatch.page_cache import PageCache
+from symbolmatch.qt_worker import DetectionWorker
+from symbolmatch.result_cache import ResultCache
+
 
 class ImageViewer(QGraphicsView):
     def __init__(self):
@@ -340,11 +347,38 @@ class ImageViewer(QGraphicsView):
         self._threshold = 0.8
         self._preview_box = None
 
+        self._page_cache = None
+        # Detections persisted across sessions, keyed by page/template pixels and parameters
+        self._result_cache = ResultCache()
+        self._worker = None
+        self._pending = []
+        self._progress = None
+
+        # Score-sorted candidates of the latest detection, collected down to the
+        # slider minimum (set_threshold_floor) so moving the slider only re-filters them
+        self._threshold_floor = None
+        self._candidates = None
+        self._last_detection = None
+
         self.setRenderHint(QPainter.Antialiasing)
         self.setDragMode(QGraphicsView.NoDrag)
 
     def set_threshold(self, value):
         self._threshold = value
+        return self.refilter_last_detection()
+
+    def set_threshold_floor(self, value):
+        self._threshold_floor = value
+
+    def refilter_last_detection(self):
+        if self._last_detection is None:
+            return None
+        obj_id, cand_boxes, cand_scores = self._last_detection
+        boxes, _ = filter_candidates(cand_boxes, cand_scores, self._threshold)
+        self._boxes = [b for b in self._boxes if b[1] != obj_id]
+        self._boxes.extend((tuple(int(v) for v in b), obj_id) for b in boxes)
+        self.viewport().update()
+        return len(boxes)
 
     def toggle_drawing_mode(self):
         self._enable_drawing = not self._enable_drawing
@@ -352,8 +386,11 @@ class ImageViewer(QGraphicsView):
         self.setCursor(cursor)
 
     def load_image(self, path):
+        self.cancel_detection()
         self._image = cv2.imread(path)
         self._clone = self._image.copy()
+        # Derived images (gray, pyramid, integrals) for this page only
+        self._page_cache = PageCache(self._clone)
         h, w, ch = self._image.shape
         q_img = QImage(self._image.data, w, h, ch * w, QImage.Format_BGR888)
         pixmap = QPixmap.fromImage(q_img)
@@ -362,6 +399,7 @@ class ImageViewer(QGraphicsView):
         self._boxes.clear()
         self._object_colors.clear()
         self._object_id = 1
+        self._last_detection = None
         self._zoom = 1.0
         self.resetTransform()
         self.update()
@@ -450,43 +488,59 @@ class ImageViewer(QGraphicsView):
         super().mouseReleaseEvent(event)
 
     def detect_objects(self, box):
-        progress = QProgressDialog("Detecting similar objects...", None, 0, 0)
-        progress.setWindowTitle("Please wait")
-        progress.setWindowModality(Qt.ApplicationModal)
-        progress.setCancelButton(None)
-        progress.show()
-        QApplication.processEvents()
-
-        x, y, w, h = box
-        template = self._clone[y:y + h, x:x + w]
-        gray_img = cv2.cvtColor(self._clone, cv2.COLOR_BGR2GRAY)
-        gray_template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-
-        h_temp, w_temp = gray_template.shape
-        all_matches = []
-
-        for scale in [1.0, 0.95, 1.05]:
-            resized_template = cv2.resize(gray_template, None, fx=scale, fy=scale)
-            r_h, r_w = resized_template.shape
-            if r_h >= gray_img.shape[0] or r_w >= gray_img.shape[1]:
-                continue
-
-            result = cv2.matchTemplate(gray_img, resized_template, cv2.TM_CCOEFF_NORMED)
-            loc = np.where(result >= self._threshold)
-            for pt in zip(*loc[::-1]):
-                all_matches.append((pt[0], pt[1], r_w, r_h))
-
-        final_boxes = []
-        for new_box in all_matches:
-            x1, y1, w1, h1 = new_box
-            overlap = False
-            for fb in final_boxes:
-                x2, y2, w2, h2 = fb
-                if abs(x1 - x2) < w1 * 0.5 and abs(y1 - y2) < h1 * 0.5:
-                    overlap = True
-                    break
-            if not overlap:
-                final_boxes.append(new_box)
+        # Selections made while a search is running are queued behind it
+        self._pending.append(box)
+        if self._worker is None:
+            self._start_next_detection()
+        else:
+            self._update_progress_label()
+
+    def cancel_detection(self):
+        self._pending.clear()
+        if self._worker is not None:
+            self._worker.cancel()
+
+    def _start_next_detection(self):
+        box = self._pending.pop(0)
+        self._worker = DetectionWorker(self._page_cache, box, self._threshold, use_pyramid=False,
+                                       floor=self._threshold_floor, result_cache=self._result_cache,
+                                       parent=self)
+        self._worker.progress.connect(self._on_detection_progress)
+        self._worker.candidates_ready.connect(self._on_candidates_ready)
+        self._worker.found.connect(self._on_detection_found)
+        self._worker.cancelled.connect(lambda b: print(f"⛔ Detection cancelled: {b}"))
+        self._worker.failed.connect(lambda b, e: QMessageBox.critical(self, "Error", f"Detection failed: {e}"))
+        self._worker.finished.connect(self._on_detection_finished)
+
+        if self._progress is None:
+            self._progress = QProgressDialog("Detecting similar objects...", "Cancel", 0, 0, self)
+            self._progress.setWindowTitle("Please wait")
+            self._progress.setWindowModality(Qt.NonModal)
+            self._progress.setMinimumDuration(0)
+            self._progress.setAutoClose(False)
+            self._progress.setAutoReset(False)
+            self._progress.canceled.connect(self.cancel_detection)
+        self._progress.setRange(0, 0)
+        self._update_progress_label()
+        self._progress.show()
+        self._worker.start()
+
+    def _update_progress_label(self):
+        if self._progress is not None:
+            queued = f" ({len(self._pending)} queued)" if self._pending else ""
+            self._progress.setLabelText(f"Detecting similar objects...{queued}")
+
+    def _on_detection_progress(self, done, total):
+        if self._progress is not None:
+            self._progress.setRange(0, total)
+            self._progress.setValue(done)
+
+    def _on_candidates_ready(self, box, cand_boxes, cand_scores):
+        self._candidates = (cand_boxes, cand_scores)
+
+    def _on_detection_found(self, box, final_boxes, elapsed):
+        if self._worker is None or self._worker.is_cancelled():
+            return
 
         # Generate non-repeating colors
         used_hues = {c.hue() for c in self._object_colors.values()}
@@ -502,12 +556,27 @@ class ImageViewer(QGraphicsView):
 
         for b in final_boxes:
             self._boxes.append((b, self._object_id))
-
-        print(f"✅ Detected: {len(final_boxes)} objects")
+        self._last_detection = (self._object_id, *self._candidates)
+
+        stats = self._result_cache.stats()
+        print(f"💾 Result cache: {stats['hits']} hits, {stats['misses']} misses, {stats['bytes'] / 1e6:.1f} MB")
+        ink = self._worker.ink_stats()
+        if ink is not None and ink["total"]:
+            saved = saved_seconds(elapsed, ink["skipped"])
+            print(f"🧹 Blank paper skipped: {ink['skipped']:.0%} of the page (~{saved:.2f}s saved)")
+        print(f"✅ Detected: {len(final_boxes)} objects ({elapsed:.2f}s)")
         self._object_id += 1
-        progress.close()
         self.update()
 
+    def _on_detection_finished(self):
+        self._worker.deleteLater()
+        self._worker = None
+        if self._pending:
+            self._start_next_detection()
+        elif self._progress is not None:
+            self._progress.close()
+            self._progress = None
+
     def drawForeground(self, painter, rect):
         painter.setRenderHint(QPainter.Antialiasing)
         if self._drawing and self._start and self._end:
@@ -547,6 +616,7 @@ class MainWindow(QMainWindow):
         self.threshold_slider.setMaximum(100)
         self.threshold_slider.setValue(80)
         self.threshold_slider.valueChanged.connect(self.update_threshold)
+        self.viewer.set_threshold_floor(self.threshold_slider.minimum() / 100.0)
 
         self.toolbar.addWidget(self.slider_label)
         self.toolbar.addWidget(self.threshold_slider)
@@ -557,8 +627,9 @@ class MainWindow(QMainWindow):
         self.viewer.toggle_drawing_mode()
 
     def update_threshold(self, value):
-        self.slider_label.setText(f"Detection Threshold: {value}%")
-        self.viewer.set_threshold(value / 100.0)
+        count = self.viewer.set_threshold(value / 100.0)
+        matches = f" ({count} matches)" if count is not None else ""
+        self.slider_label.setText(f"Detection Threshold: {value}%{matches}")
 
     def open_image(self):
         path, _ = QFileDialog.getOpenFileName(self, "Select Image", "", "Images (*.png *.jpg *.bmp)")
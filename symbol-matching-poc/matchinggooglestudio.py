@@ -1,6 +1,6 @@
+import os
 import sys
 import cv2
-import numpy as np
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QFileDialog, QGraphicsView, QGraphicsScene,
     QGraphicsPixmapItem, QProgressDialog, QToolBar, QAction, QSlider, QLabel,
@@ -9,6 +9,12 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor, QPen
 from PyQt5.QtCore import Qt, QRectF, pyqtSignal
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from symbolmatch.bank import TemplateBank
+from symbolmatch.cascade import cascade_match
+from symbolmatch.page_cache import PageCache
+from symbolmatch.scene_features import SceneFeatures
+
 class ImageViewer(QGraphicsView):
     detection_finished = pyqtSignal()
 
@@ -23,6 +29,10 @@ class ImageViewer(QGraphicsView):
         self._start, self._end, self._start_pan_pos = None, None, None
         self._object_id = 1; self._enable_drawing = False
         self._threshold = 0.8; self._preview_box = None
+        # Gray page and ink map shared by every detection on this image
+        self._page_cache = None
+        # Page SIFT features for the cascade proposals, detected in the background once per page
+        self._scene_features = None
         self.setRenderHint(QPainter.Antialiasing); self.setDragMode(QGraphicsView.NoDrag)
 
     def set_threshold(self, value): self._threshold = value
@@ -32,6 +42,8 @@ class ImageViewer(QGraphicsView):
         self._image = cv2.imread(path)
         if self._image is None: QMessageBox.critical(self, "Error", f"Failed to load image from {path}"); return
         self._clone = self._image.copy()
+        self._page_cache = PageCache(self._clone)
+        self._scene_features = SceneFeatures(self._page_cache, "sift", 5000, image_path=path).start()
         h, w, ch = self._image.shape
         q_img = QImage(self._image.data, w, h, ch * w, QImage.Format_BGR888)
         self.image_item.setPixmap(QPixmap.fromImage(q_img))
@@ -86,61 +98,30 @@ class ImageViewer(QGraphicsView):
         
         try:
             x_ref, y_ref, w_ref, h_ref = box
-            template_ref = self._clone[y_ref:y_ref + h_ref, x_ref:x_ref + w_ref]
-            gray_img = cv2.cvtColor(self._clone, cv2.COLOR_BGR2GRAY)
-            
-            flipped_template_ref = cv2.flip(template_ref, 1)
-            templates_to_check = [(template_ref, "Original"), (flipped_template_ref, "Flipped")]
-            
-            all_found_rects = []
-            sift = cv2.SIFT_create(nfeatures=5000)
-            kp_img, des_img = sift.detectAndCompute(gray_img, None)
+            gray_img = self._page_cache.gray()
+            template_ref = gray_img[y_ref:y_ref + h_ref, x_ref:x_ref + w_ref]
 
-            for tpl, tpl_name in templates_to_check:
-                gray_tpl = cv2.cvtColor(tpl, cv2.COLOR_BGR2GRAY)
-                h_tpl, w_tpl = gray_tpl.shape
-                
-                # --- [METHOD 1] THE "PERFECT" MATCH (High Certainty) ---
-                print(f"🚀 [METHOD 1] Searching for a 'Perfect Match' with {tpl_name} template...")
-                result = cv2.matchTemplate(gray_img, gray_tpl, cv2.TM_CCOEFF_NORMED)
-                _, max_val, _, max_loc = cv2.minMaxLoc(result)
-                
-                if max_val > 0.95:
-                    print(f"✅ Found a perfect match (Score: {max_val:.2f})!")
-                    all_found_rects.append((max_loc[0], max_loc[1], w_tpl, h_tpl))
-                    continue # Found a perfect match, no need for other methods for THIS template
-
-                # --- [METHOD 2] "GOOD ENOUGH" MATCHES (User Threshold) ---
-                print(f"⚠️ [METHOD 2] No perfect match. Searching with threshold {self._threshold:.2f}...")
-                loc = np.where(result >= self._threshold)
-                found_count = len(loc[0])
-                if found_count > 0:
-                    print(f"✅ Found {found_count} good enough matches.")
-                    rects = [(pt[0], pt[1], w_tpl, h_tpl) for pt in zip(*loc[::-1])]
-                    all_found_rects.extend(rects)
-                    continue # Found good matches, no need for SIFT for THIS template
-
-                # --- [METHOD 3] "TRANSFORMED" MATCHES (SIFT + Homography) ---
-                if des_img is None: continue
-                print(f"⚠️ [METHOD 3] Template matching failed. Trying SIFT...")
-                kp_tpl, des_tpl = sift.detectAndCompute(gray_tpl, None)
-                if des_tpl is not None and len(kp_tpl) > 4:
-                    bf = cv2.BFMatcher(); matches = bf.knnMatch(des_tpl, des_img, k=2)
-                    good_matches = [m for m, n in matches if len(m_n) == 2 and m.distance < 0.75 * n.distance for m_n in matches]
-                    
-                    if len(good_matches) >= 7:
-                        src_pts = np.float32([kp_tpl[m.queryIdx].pt for m in good_matches]).reshape(-1,1,2)
-                        dst_pts = np.float32([kp_img[m.trainIdx].pt for m in good_matches]).reshape(-1,1,2)
-                        M, _ = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
-                        if M is not None:
-                            pts = np.float32([[0,0],[0,h_tpl-1],[w_tpl-1,h_tpl-1],[w_tpl-1,0]]).reshape(-1,1,2)
-                            dst = cv2.perspectiveTransform(pts, M)
-                            all_found_rects.append(cv2.boundingRect(dst))
-                            print(f"✅ SIFT found a transformed match.")
-
-            # --- Post-processing: Merge all found boxes from all methods ---
+            # Original and mirrored selection; a mirror-symmetric symbol folds into a single variant
+            bank = TemplateBank([("selection", template_ref)], rotations=(0,), flips=(None, "h"))
+            names = {None: "Original", "h": "Flipped"}
+            scene = self._scene_features.geometry()
+
+            all_found_rects = []
+            for _, variant in bank.entries:
+                tpl_name = "/".join(names[t.flip] for t in variant.aliases)
+                # Blob and keypoint proposals -> windowed correlation -> homography for rotated or scaled ones
+                stats = {}
+                boxes, _ = cascade_match(gray_img, variant.image, self._threshold, "sift", 5000, scene,
+                                         self._page_cache, stats=stats)
+                seconds = ", ".join(f"{stage} {t:.2f}s" for stage, t in stats["seconds"].items())
+                print(f"🔎 [{tpl_name}] {stats['windows']} windows ({stats['correlated']:.2%} of the page): "
+                      f"{stats['verified']} verified, {stats['transformed']}/{stats['survivors']} transformed ({seconds})")
+                all_found_rects.extend(tuple(int(v) for v in b) for b in boxes)
+
+            # --- Post-processing: Merge the boxes of both variants ---
             if all_found_rects:
-                merged_rects, _ = cv2.groupRectangles(all_found_rects, 1, 0.4)
+                # Each rect is listed twice so that lone matches survive groupThreshold=1
+                merged_rects, _ = cv2.groupRectangles([tuple(r) for r in all_found_rects] * 2, 1, 0.4)
                 print(f"📦 Found {len(merged_rects)} unique object(s) after merging.")
                 
                 hue = (self._object_id * 47) % 360
@@ -173,7 +154,7 @@ class MainWindow(QMainWindow):
         self.toolbar.addAction(open_action); self.toolbar.addSeparator()
         self.marker_action = QAction("Enable Marker", self); self.marker_action.setCheckable(True)
         self.marker_action.toggled.connect(self.toggle_marker_mode); self.toolbar.addAction(self.marker_action)
-        self.slider_label = QLabel("  Template Fallback Threshold: 80%")
+        self.slider_label = QLabel("  Match Threshold: 80%")
         self.threshold_slider = QSlider(Qt.Horizontal); self.threshold_slider.setMinimum(50)
         self.threshold_slider.setMaximum(99); self.threshold_slider.setValue(80)
         self.threshold_slider.valueChanged.connect(self.update_threshold)
@@ -181,7 +162,7 @@ class MainWindow(QMainWindow):
         self.viewer.detection_finished.connect(lambda: self.marker_action.setChecked(False))
         self.open_image()
     def toggle_marker_mode(self, checked): self.viewer.toggle_drawing_mode(checked); self.marker_action.setText("Disable Marker" if checked else "Enable Marker")
-    def update_threshold(self, value): self.slider_label.setText(f"  Template Fallback Threshold: {value}%"); self.viewer.set_threshold(value / 100.0)
+    def update_threshold(self, value): self.slider_label.setText(f"  Match Threshold: {value}%"); self.viewer.set_threshold(value / 100.0)
     def open_image(self):
         path, _ = QFileDialog.getOpenFileName(self, "Select Image", "", "Images (*.png *.jpg *.jpeg *.bmp)")
         if path: self.viewer.load_image(path)
@@ -1,6 +1,6 @@
+import os
 import sys
 import cv2
-import numpy as np
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QFileDialog, QGraphicsView, QGraphicsScene,
     QGraphicsPixmapItem, QProgressDialog, QToolBar, QAction, QSlider, QLabel,
@@ -8,7 +8,12 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor, QPen
 from PyQt5.QtCore import Qt, QRectF
-from sklearn.cluster import DBSCAN 
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from symbolmatch.features import DetectionFailed, detect_instances
+from symbolmatch.page_cache import PageCache
+from symbolmatch.scene_features import SceneFeatures
+
 
 class ImageViewer(QGraphicsView):
     def __init__(self):
@@ -34,6 +39,9 @@ class ImageViewer(QGraphicsView):
         self._enable_drawing = False
         self._threshold = 0.8
         self._preview_box = None
+        self._page_cache = None
+        # Page SIFT features, detected in the background once per page
+        self._scene_features = None
 
         self.setRenderHint(QPainter.Antialiasing)
         self.setDragMode(QGraphicsView.NoDrag)
@@ -49,6 +57,8 @@ class ImageViewer(QGraphicsView):
     def load_image(self, path):
         self._image = cv2.imread(path)
         self._clone = self._image.copy()
+        self._page_cache = PageCache(self._clone)
+        self._scene_features = SceneFeatures(self._page_cache, "sift", image_path=path).start()
         h, w, ch = self._image.shape
         q_img = QImage(self._image.data, w, h, ch * w, QImage.Format_BGR888)
         pixmap = QPixmap.fromImage(q_img)
@@ -136,13 +146,13 @@ class ImageViewer(QGraphicsView):
                 self.viewport().update()
                 reply = QMessageBox.question(self, "Confirm", "Is this the correct mark?", QMessageBox.Ok | QMessageBox.Cancel)
                 if reply == QMessageBox.Ok:
-                    self.detect_objects_with_dbscan(self._preview_box)
+                    self.detect_objects(self._preview_box)
                 self._preview_box = None
                 self._enable_drawing = False
                 self.setCursor(Qt.ArrowCursor)
         super().mouseReleaseEvent(event)
 
-    def detect_objects_with_dbscan(self, box):
+    def detect_objects(self, box):
         progress = QProgressDialog("Detecting objects (with overlap)...", None, 0, 0)
         progress.setWindowTitle("Please wait")
         progress.setWindowModality(Qt.ApplicationModal)
@@ -151,44 +161,26 @@ class ImageViewer(QGraphicsView):
         QApplication.processEvents()
 
         x, y, w, h = box
-        template = self._clone[y:y + h, x:x + w]
-        gray_img = cv2.cvtColor(self._clone, cv2.COLOR_BGR2GRAY)
-        gray_template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-
-        sift = cv2.SIFT_create()
-        kp1, des1 = sift.detectAndCompute(gray_template, None)
-        kp2, des2 = sift.detectAndCompute(gray_img, None)
-
-        if des1 is None or des2 is None or len(kp1) < 4 or len(kp2) < 10:
+        gray_img = self._page_cache.gray()
+        gray_template = gray_img[y:y + h, x:x + w]
+
+        try:
+            # Geometrically verified instances, sized and turned like the match rather than template-sized
+            stats = {}
+            boxes, _ = detect_instances(gray_img, gray_template, "sift", 0, scene=self._scene_features.geometry(),
+                                        stats=stats)
+            print(f"Matches: {stats['matches']}, verified instances: {stats['instances']}")
+        except DetectionFailed as e:
             progress.close()
-            QMessageBox.warning(self, "Detection Failed", "Not enough features to detect.")
+            QMessageBox.warning(self, "Detection Failed", str(e))
             return
 
-        index_params = dict(algorithm=1, trees=5)
-        search_params = dict(checks=50)
-        flann = cv2.FlannBasedMatcher(index_params, search_params)
-        matches = flann.knnMatch(des1, des2, k=2)
-
-        good_matches = [m for m, n in matches if m.distance < 0.7 * n.distance]
-        print(f"Good matches: {len(good_matches)}")
-
-        if len(good_matches) >= 4:
-            match_coords = np.array([kp2[m.trainIdx].pt for m in good_matches])
-            clustering = DBSCAN(eps=25, min_samples=3).fit(match_coords)
-            labels = clustering.labels_
-            print(f"Detected clusters: {set(labels)}")
-
-            for label in set(labels):
-                if label == -1:
-                    continue
-                cluster_pts = match_coords[labels == label]
-                cx, cy = np.mean(cluster_pts, axis=0)
-                box_x, box_y = int(cx - w / 2), int(cy - h / 2)
-                hue = (self._object_id * 47) % 360
-                color = QColor.fromHsv(hue, 255, 255)
-                self._object_colors[self._object_id] = color
-                self._boxes.append(((box_x, box_y, w, h), self._object_id))
-                self._object_id += 1
+        for b in boxes:
+            hue = (self._object_id * 47) % 360
+            color = QColor.fromHsv(hue, 255, 255)
+            self._object_colors[self._object_id] = color
+            self._boxes.append((b, self._object_id))
+            self._object_id += 1
 
         progress.close()
         self.update()
@@ -8,7 +8,6 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor, QPen
 from PyQt5.QtCore import Qt, QRectF
-from sklearn.cluster import DBSCAN 
 
 class ImageViewer(QGraphicsView):
     def __init__(self):
@@ -1,6 +1,6 @@
+import os
 import sys
 import cv2
-import numpy as np
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QFileDialog, QGraphicsView, QGraphicsScene,
     QGraphicsPixmapItem, QProgressDialog, QToolBar, QAction, QSlider, QLabel,
@@ -9,6 +9,11 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor, QPen
 from PyQt5.QtCore import Qt, QRectF
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from symbolmatch.features import DetectionFailed, detect_instances
+from symbolmatch.page_cache import PageCache
+from symbolmatch.scene_features import SceneFeatures
+
 
 class ImageViewer(QGraphicsView):
     def __init__(self):
@@ -34,6 +39,9 @@ class ImageViewer(QGraphicsView):
         self._enable_drawing = False
         self._threshold = 0.8
         self._preview_box = None
+        self._page_cache = None
+        # Page ORB features, detected in the background once per page
+        self._scene_features = None
 
         self.setRenderHint(QPainter.Antialiasing)
         self.setDragMode(QGraphicsView.NoDrag)
@@ -49,6 +57,8 @@ class ImageViewer(QGraphicsView):
     def load_image(self, path):
         self._image = cv2.imread(path)
         self._clone = self._image.copy()
+        self._page_cache = PageCache(self._clone)
+        self._scene_features = SceneFeatures(self._page_cache, "orb", 5000, image_path=path).start()
         h, w, ch = self._image.shape
         q_img = QImage(self._image.data, w, h, ch * w, QImage.Format_BGR888)
         pixmap = QPixmap.fromImage(q_img)
@@ -214,39 +224,20 @@ class ImageViewer(QGraphicsView):
 
     def detect_objects(self, box):
         x, y, w, h = box
-        template = self._clone[y:y + h, x:x + w]
-        gray_template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-        gray_scene = cv2.cvtColor(self._clone, cv2.COLOR_BGR2GRAY)
-
-        # ORB detector
-        orb = cv2.ORB_create(5000)
-        kp1, des1 = orb.detectAndCompute(gray_template, None)
-        kp2, des2 = orb.detectAndCompute(gray_scene, None)
-
-        if des1 is None or des2 is None:
-            QMessageBox.warning(self, "Warning", "Not enough features detected.")
-            return
-
-        # Match descriptors using BFMatcher
-        bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
-        matches = bf.match(des1, des2)
-        matches = sorted(matches, key=lambda x: x.distance)
-
-        if len(matches) < 10:
-            QMessageBox.warning(self, "Warning", "Not enough good matches.")
+        gray_scene = self._page_cache.gray()
+        gray_template = gray_scene[y:y + h, x:x + w]
+
+        # ORB matches voted into poses and verified one pose at a time: every rotated/scaled instance
+        try:
+            stats = {}
+            boxes, _ = detect_instances(gray_scene, gray_template, "orb", 5000, scene=self._scene_features.geometry(),
+                                        stats=stats)
+            print(f"Matches: {stats['matches']}, verified instances: {stats['instances']}")
+        except DetectionFailed as e:
+            QMessageBox.warning(self, "Warning", str(e))
             return
 
-        src_pts = np.float32([kp1[m.queryIdx].pt for m in matches]).reshape(-1, 1, 2)
-        dst_pts = np.float32([kp2[m.trainIdx].pt for m in matches]).reshape(-1, 1, 2)
-
-        # Find homography to detect rotated/scaled positions
-        M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
-        if M is not None:
-            h, w = gray_template.shape
-            pts = np.float32([[0, 0], [0, h], [w, h], [w, 0]]).reshape(-1, 1, 2)
-            dst = cv2.perspectiveTransform(pts, M)
-            x, y, w, h = cv2.boundingRect(dst)
-
+        for x, y, w, h in boxes:
             # Assign color and object ID
             used_hues = {c.hue() for c in self._object_colors.values()}
             for i in range(360):
@@ -259,9 +250,7 @@ class ImageViewer(QGraphicsView):
             self._boxes.append(((x, y, w, h), self._object_id))
             print(f"✅ Detected object with rotation/scale at: {x}, {y}")
             self._object_id += 1
-            self.update()
-        else:
-            QMessageBox.warning(self, "Warning", "Failed to compute homography.")
+        self.update()
 
 
 
@@ -1,6 +1,13 @@
+import os
+import sys
+import time
 import cv2
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from symbolmatch.ink import InkMap, saved_seconds
+from symbolmatch.multi import match_templates
+
 # Load grayscale and color image
 img_gray = cv2.imread('../assets/Electrical IFC Set (05.14.2025) 46_page_1.png', 0)
 if img_gray is None:
@@ -10,7 +17,6 @@ if img_gray is None:
 img_color = cv2.cvtColor(img_gray, cv2.COLOR_GRAY2BGR)
 method = cv2.TM_CCOEFF_NORMED
 threshold = 0.544
-boxes = []
 
 # Template image paths
 template_paths = [
@@ -31,7 +37,8 @@ def rotate_template(template, angle):
     elif angle == 270:
         return cv2.rotate(template, cv2.ROTATE_90_COUNTERCLOCKWISE)
 
-# Template matching
+# Template matching: every template and rotation is searched in one pass
+templates = []
 for template_path in template_paths:
     template = cv2.imread(template_path, 0)
     if template is None:
@@ -39,44 +46,16 @@ for template_path in template_paths:
         continue
 
     for angle in [0, 90, 180, 270]:
-        rotated_template = rotate_template(template, angle)
-        h, w = rotated_template.shape
-        res = cv2.matchTemplate(img_gray, rotated_template, method)
-        loc = np.where(res >= threshold)
-        for pt in zip(*loc[::-1]):
-            boxes.append([pt[0], pt[1], pt[0] + w, pt[1] + h, res[pt[1], pt[0]]])
-
-# Non-Maximum Suppression
-def nms(boxes, overlapThresh=0.3):
-    if len(boxes) == 0:
-        return []
-    boxes = np.array(boxes)
-    x1, y1, x2, y2, scores = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3], boxes[:, 4]
-    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-    order = scores.argsort()[::-1]
-    keep = []
-
-    while order.size > 0:
-        i = order[0]
-        keep.append(i)
-
-        xx1 = np.maximum(x1[i], x1[order[1:]])
-        yy1 = np.maximum(y1[i], y1[order[1:]])
-        xx2 = np.minimum(x2[i], x2[order[1:]])
-        yy2 = np.minimum(y2[i], y2[order[1:]])
-
-        w = np.maximum(0, xx2 - xx1 + 1)
-        h = np.maximum(0, yy2 - yy1 + 1)
-        inter = w * h
-        iou = inter / (areas[i] + areas[order[1:]] - inter)
-        inds = np.where(iou <= overlapThresh)[0]
-        order = order[inds + 1]
-
-    return boxes[keep]
-
-# Draw boxes on color image
-filtered_boxes = nms(boxes)
-for (x1, y1, x2, y2, _) in filtered_boxes:
+        templates.append((template_path, rotate_template(template, angle)))
+
+# Overlapping hits of all templates are suppressed together; blank paper is skipped
+ink = InkMap(img_gray)
+started = time.perf_counter()
+filtered_boxes, scores, labels = match_templates(img_gray, templates, threshold, overlap_thresh=0.3, ink=ink)
+elapsed = time.perf_counter() - started
+skipped = ink.stats()["skipped"]
+print(f"Blank paper skipped: {skipped:.0%} of the page (~{saved_seconds(elapsed, skipped):.1f}s saved)")
+for (x1, y1, x2, y2) in filtered_boxes:
     cv2.rectangle(img_color, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
 
 print(f"Total accurate matches found: {len(filtered_boxes)}")
@@ -1,8 +1,15 @@
+import os
+import sys
+import time
 import cv2
 import numpy as np
 import tkinter as tk
 from tkinter import filedialog
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from symbolmatch.bank import TemplateBank
+from symbolmatch.ink import InkMap, saved_seconds
+
 # === Step 1: File Selection ===
 root = tk.Tk()
 root.withdraw()
@@ -23,75 +30,42 @@ if not main_img_path or not template_paths:
 
 img_gray = cv2.imread(main_img_path, 0)
 img_color = cv2.cvtColor(img_gray, cv2.COLOR_GRAY2BGR)
-method = cv2.TM_CCOEFF_NORMED
-boxes = []
-
-# === Rotate Template ===
-def rotate_template(template, angle):
-    if angle == 0:
-        return template
-    elif angle == 90:
-        return cv2.rotate(template, cv2.ROTATE_90_CLOCKWISE)
-    elif angle == 180:
-        return cv2.rotate(template, cv2.ROTATE_180)
-    elif angle == 270:
-        return cv2.rotate(template, cv2.ROTATE_90_COUNTERCLOCKWISE)
+# Blank paper cannot hold a symbol; only windows with enough ink are searched
+ink = InkMap(img_gray)
+started = time.perf_counter()
 
 # === Step 2: Template Matching with Shading ===
 shade_levels = [0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
 
+templates = []
 for template_path in template_paths:
     original_template = cv2.imread(template_path, 0)
     if original_template is None:
         print(f"Template not found: {template_path}")
         continue
+    templates.append((template_path, original_template))
+
+# Shades are a pure gain, which TM_CCOEFF_NORMED ignores, so the bank folds
+# them (and any symmetric rotations) into one variant per distinct image and
+# matches every variant of every template in one pass over the page, suppressing
+# overlapping hits across all of them
+bank = TemplateBank(templates, rotations=[0, 90, 180, 270], shades=shade_levels)
+print(bank.summary())
+detections = bank.match(img_gray, 0.55, ink=ink)  # default low threshold
+
+elapsed = time.perf_counter() - started
+skipped = ink.stats()["skipped"]
+print(f"Blank paper skipped: {skipped:.0%} of the search (~{saved_seconds(elapsed, skipped):.1f}s saved)")
+
+# === Step 3: Draw Boxes ===
+for d in detections:
+    x, y, w, h = d.box
+    cv2.rectangle(img_color, (x, y), (x + w, y + h), (0, 255, 0), 2)
+    print(f"{os.path.basename(d.label)} at ({x}, {y}): rotated {d.rotation}, score {d.score:.2f}")
+
+print(f"Total matches found: {len(detections)}")
 
-    for shade in shade_levels:
-        shaded_template = (original_template * shade).astype(np.uint8)
-
-        for angle in [0, 90, 180, 270]:
-            rotated_template = rotate_template(shaded_template, angle)
-            h, w = rotated_template.shape
-            res = cv2.matchTemplate(img_gray, rotated_template, method)
-            loc = np.where(res >= 0.55)  # default low threshold
-
-            for pt in zip(*loc[::-1]):
-                boxes.append([pt[0], pt[1], pt[0] + w, pt[1] + h, res[pt[1], pt[0]]])
-
-# === Step 3: Non-Maximum Suppression ===
-def nms(boxes, overlapThresh=0.3):
-    if len(boxes) == 0:
-        return []
-    boxes = np.array(boxes)
-    x1, y1, x2, y2, scores = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3], boxes[:, 4]
-    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-    order = scores.argsort()[::-1]
-    keep = []
-
-    while order.size > 0:
-        i = order[0]
-        keep.append(i)
-        xx1 = np.maximum(x1[i], x1[order[1:]])
-        yy1 = np.maximum(y1[i], y1[order[1:]])
-        xx2 = np.minimum(x2[i], x2[order[1:]])
-        yy2 = np.minimum(y2[i], y2[order[1:]])
-        w = np.maximum(0, xx2 - xx1 + 1)
-        h = np.maximum(0, yy2 - yy1 + 1)
-        inter = w * h
-        iou = inter / (areas[i] + areas[order[1:]] - inter)
-        inds = np.where(iou <= overlapThresh)[0]
-        order = order[inds + 1]
-
-    return boxes[keep]
-
-# === Step 4: Draw Boxes ===
-filtered_boxes = nms(boxes)
-for (x1, y1, x2, y2, _) in filtered_boxes:
-    cv2.rectangle(img_color, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-
-print(f"Total matches found: {len(filtered_boxes)}")
-
-# === Step 5: Interactive Viewer (Zoom + Pan) ===
+# === Step 4: Interactive Viewer (Zoom + Pan) ===
 zoom = 1.0
 pan = np.array([0.0, 0.0], dtype=np.float32)
 dragging = False
@@ -0,0 +1 @@
+"""Shared symbol matching routines used by the viewers and batch scripts."""
@@ -0,0 +1,113 @@
+"""Command line entry point: python -m symbolmatch TEMPLATE PAGE [PAGE ...]"""
+import argparse
+import csv
+import json
+import sys
+
+from symbolmatch.adaptive import BUDGET
+from symbolmatch.detect import BACKENDS, DEFAULT_SCALES
+from symbolmatch.engine import METHODS, TEMPLATE_METHODS, detect_pages, load_gray
+from symbolmatch.ink import saved_seconds
+from symbolmatch.result_cache import DEFAULT_DIR
+
+
+def parse_box(text):
+    x, y, w, h = (int(v) for v in text.split(","))
+    return x, y, w, h
+
+
+def parse_scales(text):
+    return tuple(float(v) for v in text.split(","))
+
+
+def parse_range(text):
+    lo, hi = (float(v) for v in text.split(","))
+    return lo, hi
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="symbolmatch", description="Find a symbol template on drawing pages.")
+    parser.add_argument("template", help="template image, or a page to cut it from with --box")
+    parser.add_argument("pages", nargs="+", help="page images to search")
+    parser.add_argument("--box", type=parse_box, help="x,y,w,h region of the template image to use")
+    parser.add_argument("--method", choices=METHODS, default="template",
+                        help="binary scores 1-bit ink masks instead of gray levels (clean line drawings); cascade "
+                             "verifies blob and keypoint proposals and also finds rotated or scaled symbols")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--scales", type=parse_scales, default=DEFAULT_SCALES, help="comma separated, e.g. 1.0,0.95,1.05")
+    parser.add_argument("--scale-range", type=parse_range,
+                        help="lo,hi: search every scale in this range adaptively instead of --scales")
+    parser.add_argument("--budget", type=float, default=BUDGET,
+                        help="full-resolution page passes --scale-range may refine (default: %(default)s)")
+    parser.add_argument("--brute-force", action="store_true", help="disable the coarse-to-fine pyramid search")
+    parser.add_argument("--proposals", action="store_true",
+                        help="verify only around ink blobs shaped like the template (sparse symbols)")
+    parser.add_argument("--keep-blank", action="store_true", help="also search blank paper (no ink-density skipping)")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto",
+                        help="correlation backend for --method template/binary; chamfer tolerates small size and "
+                             "stroke changes with fewer scales (default: pick from template size)")
+    parser.add_argument("--cache-dir", default=DEFAULT_DIR, help="on-disk result cache (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="always recompute, never read or write the cache")
+    parser.add_argument("--processes", type=int, default=None, help="page-level worker processes (default: all cores)")
+    parser.add_argument("--format", choices=("json", "csv"), default="json",
+                        help="json writes one object per page per line as pages finish")
+    parser.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    gray_template = load_gray(args.template, args.box)
+    options = {}
+    if args.method in TEMPLATE_METHODS:
+        options = dict(threshold=args.threshold, scales=args.scales, use_pyramid=not args.brute_force,
+                       backend=args.backend, skip_blank=not args.keep_blank, proposals=args.proposals)
+        if args.scale_range is not None:
+            options.update(scale_range=args.scale_range, budget=args.budget)
+    elif args.method == "cascade":
+        options = dict(threshold=args.threshold)
+    if not args.no_cache:
+        options["cache_dir"] = args.cache_dir
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    cached = 0
+    try:
+        writer = None
+        if args.format == "csv":
+            writer = csv.writer(out)
+            writer.writerow(["page", "method", "x", "y", "w", "h", "score", "error"]
+                            + (["scale"] if "scale_range" in options else []))
+        for result in detect_pages(gray_template, args.pages, args.method, args.processes, **options):
+            if writer is None:
+                out.write(json.dumps(result) + "\n")
+            elif result["error"]:
+                writer.writerow([result["page"], result["method"], "", "", "", "", "", result["error"]])
+            else:
+                for b in result["boxes"]:
+                    writer.writerow([result["page"], result["method"], b["x"], b["y"], b["w"], b["h"], b["score"], ""]
+                                    + ([b["scale"]] if "scale" in b else []))
+            out.flush()
+            cached += result["cached"]
+            source = ", cached" if result["cached"] else ""
+            proposals = result.get("proposals")
+            if proposals and not proposals.get("fallback"):
+                source += f", {proposals['proposals']} candidates, {proposals['windows']} windows verified"
+            cascade = result.get("cascade")
+            if cascade:
+                source += (f", {cascade['windows']} windows verified, {cascade['transformed']} transformed ("
+                           + ", ".join(f"{stage} {t:.2f}s" for stage, t in cascade["seconds"].items()) + ")")
+            adaptive = result.get("adaptive")
+            if adaptive:
+                source += f", {len(adaptive['refined'])} scales refined for {adaptive['spent']:.2f} passes"
+            if result["skipped"]:
+                saved = saved_seconds(result["elapsed"], result["skipped"])
+                source += f", {result['skipped']:.0%} blank skipped, ~{saved:.1f}s saved"
+            print(f"✅ {result['page']}: {len(result['boxes'])} objects ({result['elapsed']}s{source})", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"💾 Result cache: {cached}/{len(args.pages)} pages served from cache", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
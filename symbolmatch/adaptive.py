@@ -0,0 +1,185 @@
+"""Adaptive scale search: probe a scale range coarsely, refine where it pays.
+
+Instead of correlating a fixed list of scales over the whole page, the
+template is probed at a geometric grid of scales (PROBE_STEP apart) on a
+pyrDown-reduced page. The page is divided into REGION-sized squares; in
+each one only the probe scales scoring within BAND_DROP of the region's
+best are kept, and each becomes a band of finer scales (FINE_STEP apart)
+that is correlated at full resolution in small windows around its coarse
+peaks. Refinement runs best coarse score first and stops once it has cost
+``budget`` full-resolution passes of the template over the page.
+"""
+import math
+
+import cv2
+import numpy as np
+
+from symbolmatch.detect import DetectionCancelled
+from symbolmatch.nms import suppress_near
+from symbolmatch.pyramid import match_windows, pyramid_levels
+from symbolmatch.result_cache import content_hash
+
+SCALE_RANGE = (0.8, 1.25)
+# Ratio between neighbouring probe scales, and between refined scales
+PROBE_STEP = 1.1
+FINE_STEP = 1.025
+# Full-resolution page passes the refinement may cost
+BUDGET = 2.0
+# Side in page pixels of the squares that pick their own scale bands
+REGION = 1024
+# Probes scoring this far below a region's best are not refined there
+BAND_DROP = 0.15
+# Coarse scores fall short of full-resolution ones by up to this much
+SLACK = 0.25
+# Probed templates keep at least this short side on the reduced page
+COARSE_MIN_SIDE = 8
+
+
+def probe_scales(scale_range=SCALE_RANGE, step=PROBE_STEP):
+    """Geometric grid of scales anchored at 1.0 covering scale_range."""
+    lo, hi = scale_range
+    if not 0 < lo <= hi:
+        raise ValueError(f"invalid scale range {scale_range!r}")
+    k0 = math.ceil(math.log(lo) / math.log(step) - 1e-9)
+    k1 = math.floor(math.log(hi) / math.log(step) + 1e-9)
+    scales = [step ** k for k in range(k0, k1 + 1)] or [math.sqrt(lo * hi)]
+    return tuple(round(s, 4) for s in scales)
+
+
+def band_scales(probe, scale_range=SCALE_RANGE, probe_step=PROBE_STEP, fine_step=FINE_STEP):
+    """The fine scales a probe stands for: half a probe step either side of it."""
+    reach = round(math.log(math.sqrt(probe_step)) / math.log(fine_step))
+    lo, hi = scale_range
+    return tuple(round(probe * fine_step ** k, 4) for k in range(-reach, reach + 1)
+                 if lo - 1e-9 <= probe * fine_step ** k <= hi + 1e-9)
+
+
+def adaptive_key(page_hash, gray_template, threshold, scale_range=SCALE_RANGE, budget=BUDGET,
+                 method=cv2.TM_CCOEFF_NORMED):
+    """ResultCache key for collect_adaptive on one page with one template and parameter set."""
+    params = dict(kind="adaptive", threshold=round(float(threshold), 4),
+                  scale_range=[float(v) for v in scale_range], budget=float(budget), method=int(method))
+    return content_hash(page_hash, gray_template, params)
+
+
+def collect_adaptive_cached(result_cache, page_hash, gray_img, gray_template, threshold=0.8,
+                            scale_range=SCALE_RANGE, budget=BUDGET, method=cv2.TM_CCOEFF_NORMED, **kwargs):
+    """collect_adaptive backed by a ResultCache; result_cache may be None."""
+    if result_cache is None:
+        return collect_adaptive(gray_img, gray_template, threshold, scale_range, budget, method, **kwargs)
+    key = adaptive_key(page_hash, gray_template, threshold, scale_range, budget, method)
+    hit = result_cache.get(key)
+    if hit is not None:
+        return hit["boxes"], hit["scores"], hit["scales"]
+    boxes, scores, scales = collect_adaptive(gray_img, gray_template, threshold, scale_range, budget, method,
+                                             **kwargs)
+    result_cache.put(key, boxes=boxes, scores=scores, scales=scales)
+    return boxes, scores, scales
+
+
+def detect_adaptive(gray_img, gray_template, threshold=0.8, scale_range=SCALE_RANGE, budget=BUDGET,
+                    method=cv2.TM_CCOEFF_NORMED, **kwargs):
+    """Find gray_template at any scale in scale_range.
+
+    Returns (boxes, scores, scales): (N, 4) int boxes (x, y, w, h), their
+    scores and the template scale each was found at.
+    """
+    boxes, scores, scales = collect_adaptive(gray_img, gray_template, threshold, scale_range, budget, method,
+                                             **kwargs)
+    return filter_adaptive(boxes, scores, scales, threshold)
+
+
+def filter_adaptive(boxes, scores, scales, threshold):
+    """filter_candidates for adaptive candidates, carrying their scales along."""
+    count = int(np.searchsorted(-scores, -threshold, side="right"))
+    keep = suppress_near(boxes[:count], scores[:count])
+    return boxes[keep], scores[keep], scales[keep]
+
+
+def collect_adaptive(gray_img, gray_template, threshold=0.8, scale_range=SCALE_RANGE, budget=BUDGET,
+                     method=cv2.TM_CCOEFF_NORMED, cache=None, progress=None, is_cancelled=None, stats=None):
+    """Raw peaks >= threshold over scale_range, best score first, as (boxes, scores, scales).
+
+    A PageCache of the page lends its reduced levels. progress(done, total)
+    is reported per refinement window set and is_cancelled() polled between
+    them (DetectionCancelled is raised). A stats dict, if given, receives
+    the probe scales, the scales refined, and the budget spent in passes.
+    """
+    page_h, page_w = gray_img.shape[:2]
+    t_h, t_w = gray_template.shape[:2]
+    levels = pyramid_levels((int(t_h * scale_range[0]), int(t_w * scale_range[0])), COARSE_MIN_SIDE)
+    f = 2 ** levels
+    coarse_img = gray_img
+    for level in range(levels):
+        coarse_img = cache.pyramid(level + 1) if cache is not None else cv2.pyrDown(coarse_img)
+
+    # Coarse peaks of every probe scale, tagged with their region
+    probes = probe_scales(scale_range)
+    peaks = []
+    for probe in probes:
+        # Reduced the same way as the page, which keeps coarse scores high
+        small = gray_template if probe == 1.0 else cv2.resize(gray_template, None, fx=probe, fy=probe)
+        for _ in range(levels):
+            small = cv2.pyrDown(small)
+        if min(small.shape) < 4 or small.shape[0] >= coarse_img.shape[0] or small.shape[1] >= coarse_img.shape[1]:
+            continue
+        coarse = cv2.matchTemplate(coarse_img, small, cv2.TM_CCOEFF_NORMED)
+        # One peak per half template keeps neighbouring symbols apart
+        radius = max(1, min(small.shape) // 2)
+        kernel = np.ones((2 * radius + 1, 2 * radius + 1), np.uint8)
+        ys, xs = np.nonzero((coarse >= threshold - SLACK) & (coarse >= cv2.dilate(coarse, kernel)))
+        for x, y, score in zip(xs.tolist(), ys.tolist(), coarse[ys, xs].tolist()):
+            peaks.append((probe, x * f, y * f, score, (y * f // REGION, x * f // REGION)))
+
+    # Per region, the probes whose best peak comes close to the region's best form the bands to refine
+    windows, priority, best = {}, {}, {}
+    for probe, x, y, score, region in peaks:
+        windows.setdefault((region, probe), []).append((x, y))
+        priority[(region, probe)] = max(priority.get((region, probe), -1.0), score)
+        best[region] = max(best.get(region, -1.0), score)
+    priority = {key: score for key, score in priority.items() if score >= best[key[0]] - BAND_DROP}
+
+    # Refine bands best first until the budget of full-resolution passes is spent
+    full_cost = (page_h - t_h + 1) * (page_w - t_w + 1) * t_h * t_w
+    spent, tasks = 0.0, []
+    for key in sorted(priority, key=priority.get, reverse=True):
+        probe = key[1]
+        for scale in band_scales(probe, scale_range):
+            # Room for the coarse position error and for the origin moving with the scale
+            margin = f + int(abs(scale - probe) * max(t_h, t_w)) + 2
+            boxes = [(x - margin, y - margin, x + margin + 1, y + margin + 1) for x, y in windows[key]]
+            area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in boxes)
+            tasks.append((scale, boxes, area * round(t_h * scale) * round(t_w * scale) / full_cost))
+    for count, (_, _, cost) in enumerate(tasks):
+        if spent + cost > budget and count:
+            tasks = tasks[:count]
+            break
+        spent += cost
+    refined = {scale for scale, _, _ in tasks}
+    if stats is not None:
+        stats.update(probes=list(probes), refined=sorted(refined), spent=round(spent, 4), regions=len(best))
+
+    boxes_all, scores_all, scales_all = [], [], []
+    resized = {}
+    for done, (scale, boxes, _) in enumerate(tasks):
+        if is_cancelled is not None and is_cancelled():
+            raise DetectionCancelled()
+        if scale not in resized:
+            resized[scale] = gray_template if scale == 1.0 else cv2.resize(gray_template, None, fx=scale, fy=scale)
+        tpl = resized[scale]
+        r_h, r_w = tpl.shape[:2]
+        if r_h < page_h and r_w < page_w:
+            xs, ys, scores = match_windows(gray_img, tpl, boxes, threshold, method, max(1, min(r_w, r_h) // 4))
+            boxes_all.append(np.column_stack([xs, ys, np.full(len(xs), r_w), np.full(len(xs), r_h)]))
+            scores_all.append(scores)
+            scales_all.append(np.full(len(xs), scale, np.float32))
+        if progress is not None:
+            progress(done + 1, len(tasks))
+
+    if not boxes_all:
+        return np.empty((0, 4), np.intp), np.empty(0, np.float32), np.empty(0, np.float32)
+    boxes = np.concatenate(boxes_all).astype(np.intp)
+    scores = np.concatenate(scores_all)
+    scales = np.concatenate(scales_all)
+    order = np.argsort(-scores, kind="stable")
+    return boxes[order], scores[order], scales[order]
@@ -0,0 +1,62 @@
+"""A reusable bank of template orientations matched in one pass per page.
+
+The bank expands every template into the requested rotations and flips
+once, folds orientations whose pixels coincide (see variants.plan_variants)
+and keeps the DFTs of the survivors, so each page costs one batched
+match_templates call no matter how many pages the bank is used on.
+"""
+from collections import namedtuple
+
+import cv2
+
+from symbolmatch.multi import match_templates
+from symbolmatch.variants import plan_variants
+
+# rotation/flip describe the matched variant; orientations lists every
+# requested (rotation, flip) that produces the same pixels
+Detection = namedtuple("Detection", "box score label rotation flip orientations")
+
+
+class TemplateBank:
+    """Orientation variants of labelled templates, planned once and matched together.
+
+    templates is an iterable of (label, gray_template) pairs. Extra keyword
+    arguments (scales, shades, offsets) go to plan_variants.
+    """
+
+    def __init__(self, templates, rotations=(0, 90, 180, 270), flips=(None,), **plan):
+        self.entries = []
+        self.requested = 0
+        for label, gray_template in templates:
+            variants = plan_variants(gray_template, rotations=rotations, flips=flips,
+                                     method=cv2.TM_CCOEFF_NORMED, **plan)
+            self.requested += variants.requested
+            self.entries.extend((label, v) for v in variants.variants)
+        self._spectra = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def summary(self):
+        return f"{len(self)} of {self.requested} template variants need matching"
+
+    def match(self, page, threshold=0.8, overlap_thresh=0.3, ink=None):
+        """Detections of every variant on page, de-duplicated together, best score first.
+
+        page is a gray image or a PageCache; with a PageCache its gray image
+        and InkMap are reused (ink=False searches blank paper too).
+        """
+        if hasattr(page, "gray"):
+            ink = page.ink() if ink is None else ink
+            page = page.gray()
+        templates = [(i, v.image) for i, (_, v) in enumerate(self.entries)]
+        radii = [max(1, min(v.image.shape[:2]) // 4) for _, v in self.entries]
+        boxes, scores, indices = match_templates(page, templates, threshold, overlap_thresh, radii, ink=ink or None,
+                                                 spectra=self._spectra)
+        detections = []
+        for (x1, y1, x2, y2), score, i in zip(boxes.tolist(), scores.tolist(), indices):
+            label, variant = self.entries[i]
+            detections.append(Detection((x1, y1, x2 - x1 + 1, y2 - y1 + 1), score, label, variant.transform.rotation,
+                                        variant.transform.flip,
+                                        tuple(dict.fromkeys((t.rotation, t.flip) for t in variant.aliases))))
+        return detections
@@ -0,0 +1,113 @@
+"""Bit-packed matching for black-and-white drawings.
+
+TM_BINARY thresholds page and template to one bit per pixel and packs each
+page row into 64-bit words, 1/24 of the BGR page the viewers decode. For
+every ink pixel of the template the page bits shifted under it are added
+into a bit-sliced counter with carry-save adders, so one word operation
+advances 64 search positions at once. The count of template ink over page
+ink, together with the ink of each window from an integral image, gives
+the phi coefficient: exactly TM_CCOEFF_NORMED of the two binarized images.
+"""
+import cv2
+import numpy as np
+
+from symbolmatch.ink import DARK
+
+# Not an OpenCV method; accepted wherever a matchTemplate method is
+TM_BINARY = -1
+# Result rows counted at a time; keeps the bit planes cache resident
+CHUNK_ROWS = 64
+
+
+def match_template(gray_img, gray_template, method=cv2.TM_CCOEFF_NORMED):
+    """cv2.matchTemplate that also understands TM_BINARY."""
+    if method == TM_BINARY:
+        return binary_ccoeff_normed(gray_img, gray_template)
+    return cv2.matchTemplate(gray_img, gray_template, method)
+
+
+def binarize(gray_img, dark=DARK):
+    """1 where the pixel is ink, 0 for paper."""
+    return cv2.threshold(gray_img, dark - 1, 1, cv2.THRESH_BINARY_INV)[1]
+
+
+def pack_rows(binary):
+    """Pack a 0/1 image into uint64 words per row, bit i of word k holding column 64k + i.
+
+    One spare zero word per row lets shifted reads run past the last column.
+    """
+    h, w = binary.shape
+    words = -(-w // 64) + 1
+    padded = np.zeros((h, words * 64), np.uint8)
+    padded[:, :w] = binary
+    return np.packbits(padded, axis=1, bitorder="little").view(np.uint64)
+
+
+def _count_chunk(packed, rows, cols, words, counts):
+    """Add the overlap counts of len(counts) result rows into counts."""
+    n_rows = len(counts)
+    # Page bits moved left by c columns, one array per template column in use
+    shifted = {}
+    for c in np.unique(cols).tolist():
+        q, s = divmod(c, 64)
+        lo = packed[:, q:q + words]
+        shifted[c] = (lo >> np.uint64(s)) | (packed[:, q + 1:q + 1 + words] << np.uint64(64 - s)) if s else lo
+
+    # Carry-save accumulation: weights[i] holds at most two planes of weight 2**i
+    weights = [[]]
+    for r, c in zip(rows.tolist(), cols.tolist()):
+        plane, level = shifted[c][r:r + n_rows], 0
+        while plane is not None:
+            if level == len(weights):
+                weights.append([])
+            slot = weights[level]
+            if len(slot) < 2:
+                slot.append(plane)
+                plane = None
+            else:
+                a, b = slot
+                x = a ^ b
+                carry = (a & b) | (plane & x)
+                slot[:] = [x ^ plane]
+                plane, level = carry, level + 1
+
+    for level, slot in enumerate(weights):
+        for plane in slot:
+            bits = np.unpackbits(np.ascontiguousarray(plane).view(np.uint8), axis=1, bitorder="little")
+            counts += bits.astype(np.uint16) << np.uint16(level)
+
+
+def binary_ccoeff_normed(gray_img, gray_template, dark=DARK):
+    """TM_CCOEFF_NORMED of the binarized page and template, computed on packed bits."""
+    page = binarize(gray_img, dark)
+    tpl = binarize(gray_template, dark)
+    t_h, t_w = tpl.shape
+    res_h, res_w = page.shape[0] - t_h + 1, page.shape[1] - t_w + 1
+    n = float(t_h * t_w)
+    b = float(np.count_nonzero(tpl))
+    score = np.zeros((res_h, res_w), np.float32)
+    if b == 0 or b == n:
+        return score
+
+    packed = pack_rows(page)
+    ii = cv2.integral(page, sdepth=cv2.CV_32S)
+    rows, cols = np.nonzero(tpl)
+    words = -(-res_w // 64)
+    counts = np.zeros((CHUNK_ROWS, words * 64), np.uint16)
+    for r0 in range(0, res_h, CHUNK_ROWS):
+        r1 = min(res_h, r0 + CHUNK_ROWS)
+        both = counts[:r1 - r0]
+        both[:] = 0
+        _count_chunk(packed[r0:r1 + t_h - 1], rows, cols, words, both)
+        both = both[:, :res_w].astype(np.float32)
+        a = (ii[r0 + t_h:r1 + t_h, t_w:] - ii[r0:r1, t_w:]
+             - ii[r0 + t_h:r1 + t_h, :-t_w] + ii[r0:r1, :-t_w]).astype(np.float32)
+
+        # phi = (n * both - a * b) / sqrt(a * (n - a) * b * (n - b)); all-paper or all-ink windows score 0
+        denom = a * (n - a)
+        live = denom > 0
+        both *= n
+        both -= a * b
+        np.sqrt(denom * (b * (n - b)), out=denom)
+        np.divide(both, denom, out=score[r0:r1], where=live)
+    return score
@@ -0,0 +1,191 @@
+"""Proposal, verification and transform stages for throughput-oriented detection.
+
+Instead of whole-page passes chosen one after another when the previous
+one fails, every stage here only looks at what the stage before it passed
+on:
+
+1. propose: connected ink blobs shaped like the template's largest blob
+   (see symbolmatch.proposals) and clusters of keypoint matches voting for
+   the same template centre (see instances.vote_poses) name candidate
+   template positions.
+2. verify: TM_CCOEFF_NORMED is computed only in small windows around the
+   upright candidates (pyramid.match_windows).
+3. transform: keypoint clusters whose votes say rotated or scaled, and
+   upright ones no verified box covers, get a RANSAC homography fitted to
+   their matches; the page is warped back into the template's frame and
+   scored with the same correlation, so every box carries a comparable
+   score.
+
+A stats dict, if given, receives the seconds and candidate counts of each
+stage, which is what tuning the cascade is about; "features" is the page's
+keypoint detection, free when precomputed features are passed in.
+"""
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from symbolmatch.descriptor_match import match_repeated
+from symbolmatch.instances import ANGLE_BIN, LOCATION_BIN, MIN_INLIERS, REPROJ, SCALE_BIN, vote_poses
+from symbolmatch.nms import suppress_near
+from symbolmatch.proposals import ink_components, propose, proposal_windows, template_anchor
+from symbolmatch.pyramid import match_windows
+from symbolmatch.scene_features import TILE, create_detector, keypoint_geometry
+from symbolmatch.sheet_index import vote_clusters
+
+STAGES = ("features", "propose", "verify", "transform")
+# Matches a keypoint cluster needs to become a candidate
+MIN_VOTES = 3
+RATIO = 0.75
+# A cluster voting within this scale factor and angle in degrees of the template is verified upright
+UPRIGHT_SCALE = 1.1
+UPRIGHT_ANGLE = 10.0
+
+# One row per keypoint match: the two positions, the template centre it votes for and its pose
+Matches = namedtuple("Matches", "template page centres log_scales angles")
+
+
+def cascade_match(gray_img, gray_template, threshold=0.8, kind="sift", nfeatures=0, scene=None, cache=None,
+                  ratio=RATIO, min_votes=MIN_VOTES, stats=None):
+    """Find gray_template in gray_img through the three cascade stages.
+
+    scene is the page's precomputed (geometry, descriptors) of detector
+    kind, as SceneFeatures.geometry returns them; without it the page is
+    detected here, tile by tile. A PageCache for the page supplies its
+    connected components. Returns (boxes, scores) like detect_template:
+    an (N, 4) int array of (x, y, w, h) and the correlation of each box.
+    """
+    h, w = gray_template.shape[:2]
+    page_h, page_w = gray_img.shape[:2]
+    res_shape = (page_h - h + 1, page_w - w + 1)
+    timings = dict.fromkeys(STAGES, 0.0)
+    counts = {}
+
+    started = time.perf_counter()
+    if scene is None:
+        page_keypoints, des_img = create_detector(kind, nfeatures, TILE).detectAndCompute(gray_img, None)
+        scene = keypoint_geometry(page_keypoints), des_img
+    timings["features"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    origins, margins = [], []
+    anchor = template_anchor(gray_template)
+    if anchor is not None:
+        components = cache.components() if cache is not None else ink_components(gray_img)
+        xs, ys = propose(components, anchor)
+        origins.append((xs, ys))
+        margins.append(max(4, max(h, w) // 8))
+        counts["blobs"] = len(xs)
+    clusters, matches = _keypoint_clusters(gray_template, kind, nfeatures, scene, ratio, min_votes)
+    centres = np.array([np.median(matches.centres[members], axis=0) for members in clusters]).reshape(-1, 2)
+    upright = np.array([_upright(matches, members) for members in clusters], bool)
+    counts["matches"] = len(matches.centres)
+    counts["clusters"] = len(clusters)
+    counts["upright"] = int(upright.sum())
+    if upright.any():
+        # Median voted centre of every upright cluster, moved to the template origin
+        origins.append(tuple(np.round(centres[upright] - [(w - 1) / 2, (h - 1) / 2]).astype(np.intp).T))
+        # The voted centre wanders with keypoint angle and size errors
+        margins.append(max(4, int(LOCATION_BIN * max(h, w))))
+    windows = []
+    if res_shape[0] > 0 and res_shape[1] > 0:
+        for (xs, ys), margin in zip(origins, margins):
+            windows.extend(proposal_windows(np.asarray(xs), np.asarray(ys), res_shape, margin))
+    counts["windows"] = len(windows)
+    timings["propose"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    xs, ys, scores = match_windows(gray_img, gray_template, windows, threshold, cv2.TM_CCOEFF_NORMED,
+                                   max(1, min(h, w) // 4))
+    boxes = np.column_stack([xs, ys, np.full(len(xs), w), np.full(len(xs), h)]).astype(np.intp)
+    area = sum(int(min(x1, res_shape[1]) - max(x0, 0)) * int(min(y1, res_shape[0]) - max(y0, 0))
+               for x0, y0, x1, y1 in windows)
+    counts["correlated"] = area / (res_shape[0] * res_shape[1]) if windows else 0.0
+    counts["verified"] = len(xs)
+    timings["verify"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    survivors = [members for members, centre, up in zip(clusters, centres, upright)
+                 if not (up and _covered(boxes, centre))]
+    transformed = [_fit(gray_img, gray_template, matches, members) for members in survivors]
+    transformed = [t for t in transformed if t is not None and t[1] >= threshold]
+    counts["survivors"] = len(survivors)
+    counts["transformed"] = len(transformed)
+    if transformed:
+        boxes = np.concatenate([boxes, np.array([b for b, _ in transformed], np.intp)])
+        scores = np.concatenate([scores, np.array([s for _, s in transformed], np.float32)])
+    timings["transform"] = time.perf_counter() - started
+
+    order = np.argsort(-scores, kind="stable")
+    boxes, scores = boxes[order], scores[order]
+    keep = suppress_near(boxes, scores)
+    if stats is not None:
+        stats.update(counts, seconds={stage: round(t, 4) for stage, t in timings.items()})
+    return boxes[keep], scores[keep]
+
+
+def _keypoint_clusters(gray_template, kind, nfeatures, scene, ratio, min_votes):
+    """Member indices of the match clusters voting for one template centre, and the Matches."""
+    keypoints, des_tpl = create_detector(kind, nfeatures).detectAndCompute(gray_template, None)
+    if des_tpl is None or len(keypoints) < MIN_INLIERS:
+        return [], _no_matches()
+    page_geometry, des_img = scene
+    query_idx, train_idx = match_repeated(des_tpl, des_img, ratio)
+    if not len(query_idx):
+        return [], _no_matches()
+    template_geometry = keypoint_geometry(keypoints)[query_idx]
+    page_geometry = page_geometry[train_idx]
+    h, w = gray_template.shape[:2]
+    poses = vote_poses(template_geometry, page_geometry, (h, w))
+    matches = Matches(template_geometry[:, :2], page_geometry[:, :2].astype(np.float32),
+                      (poses[:, :2] * (LOCATION_BIN * max(h, w))).astype(np.float32),
+                      poses[:, 2] * SCALE_BIN, poses[:, 3] * ANGLE_BIN)
+    clusters = vote_clusters(np.zeros(len(query_idx), np.intp), matches.centres, (max(1, w // 2), max(1, h // 2)),
+                             min_votes)
+    return [members for _, members, _ in clusters], matches
+
+
+def _no_matches():
+    empty = np.empty((0, 2), np.float32)
+    return Matches(empty, empty, empty, np.empty(0), np.empty(0))
+
+
+def _upright(matches, members):
+    """Whether a cluster's matches vote for the template's own scale and orientation."""
+    angle = np.radians(matches.angles[members])
+    mean_angle = np.degrees(np.arctan2(np.sin(angle).mean(), np.cos(angle).mean()))
+    return (abs(np.median(matches.log_scales[members])) <= np.log2(UPRIGHT_SCALE)
+            and abs(mean_angle) <= UPRIGHT_ANGLE)
+
+
+def _covered(boxes, centre):
+    """Whether centre lies inside one of the (x, y, w, h) boxes."""
+    if not len(boxes):
+        return False
+    x, y = centre
+    return bool(np.any((boxes[:, 0] <= x) & (x < boxes[:, 0] + boxes[:, 2])
+                       & (boxes[:, 1] <= y) & (y < boxes[:, 1] + boxes[:, 3])))
+
+
+def _fit(gray_img, gray_template, matches, members):
+    """(box, score) of the homography fitted to one cluster's matches, or None.
+
+    The page is warped back into the template's frame and the score is the
+    TM_CCOEFF_NORMED of that warp against the template.
+    """
+    if len(members) < MIN_INLIERS:
+        return None
+    h, w = gray_template.shape[:2]
+    src, dst = matches.template[members], matches.page[members]
+    matrix, mask = cv2.findHomography(src, dst, cv2.RANSAC, REPROJ * max(h, w))
+    if matrix is None or mask.sum() < MIN_INLIERS:
+        return None
+    warped = cv2.warpPerspective(gray_img, matrix, (w, h), flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                                 borderMode=cv2.BORDER_REPLICATE)
+    score = float(cv2.matchTemplate(warped, gray_template, cv2.TM_CCOEFF_NORMED)[0, 0])
+    corners = np.float32([[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]]).reshape(-1, 1, 2)
+    placed = cv2.perspectiveTransform(corners, matrix)
+    if not np.isfinite(score) or not np.isfinite(placed).all():
+        return None
+    return tuple(int(v) for v in cv2.boundingRect(placed)), score
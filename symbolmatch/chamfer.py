@@ -0,0 +1,100 @@
+"""Chamfer matching: template ink scored by its distance to the nearest page ink.
+
+The page is turned into one distance map (L1 pixels to the nearest ink,
+truncated at TRUNCATE), so a search position costs one lookup per sampled
+template ink point rather than one multiply per template pixel. A stroke
+that sits a pixel or two off, because the symbol is drawn slightly larger
+or with a heavier pen, only loses a fraction of its score instead of
+decorrelating, which lets one scale stand in for several (see
+chamfer_scales).
+
+Forward distances alone reward any dense ink, so each peak is also scored
+backwards (page ink in the window against the template's own distance map)
+and keeps the lower of the two scores.
+"""
+import cv2
+import numpy as np
+
+from symbolmatch.ink import DARK
+from symbolmatch.peaks import find_peaks
+
+# Distance in pixels at which a template point counts as missing
+TRUNCATE = 4
+# Template ink points scored per position
+MAX_POINTS = 96
+# Result rows summed at a time; keeps the shifted rows cache resident
+CHUNK_ROWS = 64
+# Relative size change a TRUNCATE-pixel tolerance absorbs on our symbols
+SCALE_TOLERANCE = 0.05
+
+
+def distance_map(gray_img, dark=DARK, truncate=TRUNCATE):
+    """uint8 L1 distance of every pixel to the nearest ink pixel, capped at truncate."""
+    paper = cv2.threshold(gray_img, dark - 1, 255, cv2.THRESH_BINARY)[1]
+    dist = cv2.distanceTransform(paper, cv2.DIST_L1, 3, dstType=cv2.CV_8U)
+    return np.minimum(dist, truncate, out=dist)
+
+
+def edge_points(gray_template, dark=DARK, max_points=MAX_POINTS):
+    """(rows, cols) of at most max_points template ink pixels spread over the whole symbol."""
+    points = np.argwhere(gray_template < dark)
+    if len(points) > max_points:
+        points = points[np.linspace(0, len(points) - 1, max_points).astype(np.intp)]
+    return points[:, 0].tolist(), points[:, 1].tolist()
+
+
+def chamfer_scales(scales, tolerance=SCALE_TOLERANCE):
+    """The scales worth searching when each one also covers those within tolerance of it."""
+    kept = []
+    for scale in scales:
+        # Rounded so that 0.95 counts as within 0.05 of 1.0
+        if all(round(abs(scale - k), 6) > tolerance * k for k in kept):
+            kept.append(scale)
+    return tuple(kept)
+
+
+def match_chamfer(dist, gray_template, threshold, method=None, peak_radius=1, truncate=TRUNCATE):
+    """Chamfer peaks (xs, ys, scores) >= threshold of gray_template over a distance_map.
+
+    Scores run from 1 (every point on ink, both ways) to 0. method is
+    ignored; it keeps the signature of match_full so match_strip can drive it.
+    """
+    t_h, t_w = gray_template.shape[:2]
+    res_h, res_w = dist.shape[0] - t_h + 1, dist.shape[1] - t_w + 1
+    rows, cols = edge_points(gray_template)
+    if not rows or res_h <= 0 or res_w <= 0:
+        return _empty()
+    n = len(rows)
+
+    # Each point adds the distance map shifted by its offset, i.e. gathers
+    # its distance for every position at once. Groups of points are summed
+    # in uint8, where cv2.add is fastest, and then widened.
+    group = 255 // truncate
+    result = np.empty((res_h, res_w), np.float32)
+    part = np.empty((min(CHUNK_ROWS, res_h), res_w), np.uint8)
+    total = np.empty(part.shape, np.uint16)
+    for r0 in range(0, res_h, CHUNK_ROWS):
+        r1 = min(res_h, r0 + CHUNK_ROWS)
+        block, acc = part[:r1 - r0], total[:r1 - r0]
+        acc[:] = 0
+        for g in range(0, n, group):
+            block[:] = 0
+            for r, c in zip(rows[g:g + group], cols[g:g + group]):
+                cv2.add(block, dist[r0 + r:r1 + r, c:c + res_w], dst=block)
+            cv2.add(acc, block, dst=acc, dtype=cv2.CV_16U)
+        result[r0:r1] = 1.0 - acc * np.float32(1.0 / (n * truncate))
+    xs, ys, scores = find_peaks(result, threshold, peak_radius)
+
+    template_dist = distance_map(gray_template, truncate=truncate).astype(np.float32)
+    keep = np.zeros(len(xs), bool)
+    for i, (x, y) in enumerate(zip(xs.tolist(), ys.tolist())):
+        ink = dist[y:y + t_h, x:x + t_w] == 0
+        count = np.count_nonzero(ink)
+        backward = 1.0 - template_dist[ink].sum() / (count * truncate) if count else 0.0
+        scores[i] = min(scores[i], backward)
+        keep[i] = scores[i] >= threshold
+    return xs[keep], ys[keep], scores[keep]
+
+
+def _empty():
+    return np.empty(0, np.intp), np.empty(0, np.intp), np.empty(0, np.float32)
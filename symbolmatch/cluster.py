@@ -0,0 +1,97 @@
+"""DBSCAN over 2-D points with a spatial hash instead of a general neighbour search.
+
+Points are bucketed into square cells of side eps, so every neighbour of a
+point lies in its own or one of the eight adjacent cells; candidate pairs
+come from those nine cells only and are kept when within eps. Clusters are
+the connected components of core points, found by hooking and pointer
+jumping over the pair arrays rather than a per-point Python search.
+
+Labels match sklearn.cluster.DBSCAN(eps, min_samples) exactly: clusters
+are numbered in the order of their first core point, and a border point
+next to several clusters joins the lowest-numbered one, as sklearn's
+depth-first expansion leaves it.
+"""
+import numpy as np
+
+# Grids up to this many cells are indexed through a dense lookup table
+DENSE_CELLS = 1 << 22
+
+
+def dbscan(points, eps, min_samples=5):
+    """Cluster label of every point, -1 for noise; points is an (N, 2) array."""
+    points = np.asarray(points, np.float64).reshape(-1, 2)
+    n = len(points)
+    labels = np.full(n, -1, np.intp)
+    if not n:
+        return labels
+    src, dst = neighbour_pairs(points, eps)
+
+    # A point counts itself among its neighbours, as in sklearn
+    core = np.bincount(src, minlength=n) >= min_samples
+    linked = core[src] & core[dst]
+    root = _components(n, src[linked], dst[linked])
+
+    # Roots are the smallest index of their component, so sorting them numbers clusters like sklearn
+    roots = np.unique(root[core])
+    labels[core] = np.searchsorted(roots, root[core])
+    border = ~core[src] & core[dst]
+    if border.any():
+        best = np.full(n, np.iinfo(np.intp).max, np.intp)
+        np.minimum.at(best, src[border], labels[dst[border]])
+        reached = best < np.iinfo(np.intp).max
+        labels[reached] = best[reached]
+    return labels
+
+
+def neighbour_pairs(points, eps):
+    """(i, j) index arrays of every ordered pair within eps of each other, including i == j."""
+    cells = np.floor(points / eps).astype(np.int64)
+    # One spare cell on every side keeps neighbour keys from wrapping between rows
+    cells -= cells.min(axis=0) - 1
+    width = int(cells[:, 0].max()) + 2
+    height = int(cells[:, 1].max()) + 2
+    keys = cells[:, 1] * width + cells[:, 0]
+    order = np.argsort(keys, kind="stable")
+    cell_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    # Occupied-cell number of every grid cell, when the grid is small enough to hold densely
+    table = None
+    if width * height <= max(DENSE_CELLS, 4 * len(points)):
+        table = np.full(width * height, -1, np.intp)
+        table[cell_keys] = np.arange(len(cell_keys))
+
+    src, dst = [], []
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            target = keys + dy * width + dx
+            if table is not None:
+                pos = table[target]
+                i = np.flatnonzero(pos >= 0)
+            else:
+                pos = np.minimum(np.searchsorted(cell_keys, target), len(cell_keys) - 1)
+                i = np.flatnonzero(cell_keys[pos] == target)
+            first, count = starts[pos[i]], counts[pos[i]]
+            # Every point of the target cell, for every point i looking into it
+            offsets = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+            src.append(np.repeat(i, count))
+            dst.append(order[np.repeat(first, count) + offsets])
+    src, dst = np.concatenate(src), np.concatenate(dst)
+    diff = points[src] - points[dst]
+    near = np.einsum("ij,ij->i", diff, diff) <= eps * eps
+    return src[near], dst[near]
+
+
+def _components(n, src, dst):
+    """Smallest member index of the connected component of every point under the edges src-dst."""
+    root = np.arange(n)
+    while True:
+        a, b = root[src], root[dst]
+        differ = a != b
+        if not differ.any():
+            return root
+        # Hook the larger of two roots under the smaller, then jump pointers to the roots
+        np.minimum.at(root, np.maximum(a, b)[differ], np.minimum(a, b)[differ])
+        while True:
+            jumped = root[root]
+            if np.array_equal(jumped, root):
+                break
+            root = jumped
@@ -0,0 +1,140 @@
+"""Descriptor matching as array operations: k nearest neighbours, Lowe's ratio test, cross-checking.
+
+knnMatch and friends hand back one DMatch object per neighbour, and every
+filter and point lookup after that is a Python loop over them. Here the
+query-by-train distance matrix is computed a block of query rows at a
+time as one BLAS product (binary descriptors are unpacked to +-1 per bit,
+where the product gives bits minus twice the Hamming distance exactly),
+and every step works on index arrays, so points are gathered with plain
+fancy indexing: ``scene_points[train_idx]``.
+"""
+import cv2
+import numpy as np
+
+# Distance-matrix entries computed at once (64 MB of float32)
+BLOCK = 1 << 24
+# Neighbours retrieved per query row when a symbol may repeat; the farthest stands for a non-match
+KNN = 16
+
+
+def descriptor_norm(descriptors):
+    """NORM_HAMMING for binary (uint8, ORB) descriptors, NORM_L2 for float (SIFT) ones."""
+    return cv2.NORM_HAMMING if descriptors.dtype == np.uint8 else cv2.NORM_L2
+
+
+def knn_match(query, train, k=2, norm=None):
+    """(indices, distances): the k nearest train rows of every query row, nearest first.
+
+    Both are (len(query), k') arrays with k' = min(k, len(train)).
+    Distances are Hamming bit counts or Euclidean distances, as knnMatch
+    reports them.
+    """
+    indices, distances, _ = _search(query, train, k, norm, reverse=False)
+    return indices, distances
+
+
+def match_descriptors(query, train, ratio=0.75, cross_check=False, norm=None):
+    """(query_idx, train_idx, distances) of the accepted matches, best first.
+
+    ratio keeps a query row only when its nearest train row is closer than
+    ratio times the second nearest (Lowe's test; None skips it, and with a
+    ratio a train set of one row matches nothing). cross_check also
+    requires the train row's own nearest query row to be that query row,
+    as BFMatcher(crossCheck=True) does.
+    """
+    query_idx = np.empty(0, np.intp)
+    if query is None or train is None or not len(query) or not len(train):
+        return query_idx, query_idx, np.empty(0, np.float32)
+    k = 1 if ratio is None else 2
+    indices, distances, nearest_query = _search(query, train, k, norm, reverse=cross_check)
+    if indices.shape[1] < k:
+        return query_idx, query_idx, np.empty(0, np.float32)
+    keep = np.ones(len(query), bool)
+    if ratio is not None:
+        keep &= distances[:, 0] < ratio * distances[:, 1]
+    if cross_check:
+        keep &= nearest_query[indices[:, 0]] == np.arange(len(query))
+    query_idx = np.flatnonzero(keep)
+    train_idx, best = indices[query_idx, 0], distances[query_idx, 0]
+    order = np.argsort(best, kind="stable")
+    return query_idx[order], train_idx[order].astype(np.intp), best[order]
+
+
+def repeated_matches(indices, distances, ratio=0.75):
+    """(query_idx, train_idx) of the neighbours closer than ratio times each row's farthest one.
+
+    Lowe's test compares with the second nearest neighbour, which for a
+    symbol repeated on the page is usually another true instance. Here
+    the farthest of k neighbours plays the non-match, so every instance
+    among the nearer ones survives. Negative indices (no neighbour, as
+    FLANN reports them) are dropped.
+    """
+    keep = (distances < ratio * distances[:, -1:]) & (indices >= 0)
+    query_idx, column = np.nonzero(keep)
+    return query_idx, indices[query_idx, column].astype(np.intp)
+
+
+def match_repeated(query, train, ratio=0.75, k=KNN, norm=None):
+    """(query_idx, train_idx) of every repeated_matches pair among the k nearest train rows."""
+    if query is None or train is None or not len(query) or not len(train):
+        return np.empty(0, np.intp), np.empty(0, np.intp)
+    indices, distances = knn_match(query, train, k, norm)
+    return repeated_matches(indices, distances, ratio)
+
+
+def _search(query, train, k, norm, reverse):
+    """k nearest train rows per query row and, with reverse, the nearest query row per train row."""
+    norm = descriptor_norm(train) if norm is None else norm
+    n, m = len(query), len(train)
+    k = min(k, m)
+    indices = np.empty((n, k), np.intp)
+    distances = np.empty((n, k), np.float32)
+    best_query = np.zeros(m, np.intp)
+    best_dist = np.full(m, np.inf, np.float32)
+    query, train = _embed(query, norm), _embed(train, norm)
+    if norm == cv2.NORM_L2:
+        train_sq = np.einsum("ij,ij->i", train, train)
+    rows = max(1, BLOCK // max(1, m))
+    for r0 in range(0, n, rows):
+        block = query[r0:r0 + rows]
+        dist = block @ train.T
+        if norm == cv2.NORM_L2:
+            # Squared distances |q|^2 + |t|^2 - 2 q.t
+            dist *= -2.0
+            dist += train_sq
+            dist += np.einsum("ij,ij->i", block, block)[:, None]
+            np.maximum(dist, 0.0, out=dist)
+        else:
+            # Agreeing bits add 1 and differing ones -1
+            dist -= train.shape[1]
+            dist *= -0.5
+        if k == 1:
+            # argmin keeps the first of tied rows, as BFMatcher does
+            nearest = dist.argmin(axis=1)[:, None]
+        elif k < m:
+            nearest = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        else:
+            nearest = np.broadcast_to(np.arange(m), dist.shape)
+        near_dist = np.take_along_axis(dist, nearest, axis=1)
+        order = np.argsort(near_dist, axis=1, kind="stable")[:, :k]
+        indices[r0:r0 + len(block)] = np.take_along_axis(nearest, order, axis=1)
+        distances[r0:r0 + len(block)] = np.take_along_axis(near_dist, order, axis=1)
+        if reverse:
+            column_best = dist.argmin(axis=0)
+            column_dist = dist[column_best, np.arange(m)]
+            better = column_dist < best_dist
+            best_query[better] = column_best[better] + r0
+            best_dist[better] = column_dist[better]
+    if norm == cv2.NORM_L2:
+        np.sqrt(distances, out=distances)
+    return indices, distances, best_query
+
+
+def _embed(descriptors, norm):
+    """float32 rows whose products give the distances of norm (see _search)."""
+    if norm == cv2.NORM_HAMMING:
+        signs = np.unpackbits(np.asarray(descriptors, np.uint8), axis=1).astype(np.float32)
+        return signs * 2.0 - 1.0
+    if norm != cv2.NORM_L2:
+        raise ValueError(f"Unsupported norm {norm!r}, expected NORM_L2 or NORM_HAMMING")
+    return np.asarray(descriptors, np.float32)
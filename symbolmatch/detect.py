@@ -0,0 +1,317 @@
+"""Multi-scale template detection shared by the viewers."""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+from symbolmatch.chamfer import chamfer_scales, distance_map, match_chamfer
+from symbolmatch.fftcorr import match_many_fft, tile_size_for
+from symbolmatch.ink import band_rows_for, min_ink_for
+from symbolmatch.nms import suppress_near
+from symbolmatch.parallel import default_workers, match_strip, page_strips, strip_rows_for
+from symbolmatch.proposals import ink_components, propose, proposal_windows, template_anchor
+from symbolmatch.pyramid import match_full, match_pyramid, match_windows, pyramid_levels
+from symbolmatch.result_cache import content_hash
+
+DEFAULT_SCALES = (1.0, 0.95, 1.05)
+BACKENDS = ("auto", "spatial", "fft", "chamfer")
+# Template areas for which one overlap-save FFT pass over all scales beats
+# brute-force matchTemplate on our sheets (see benchmarks/fft_crossover.py).
+# matchTemplate switches to its own block DFT for large templates, and the
+# pyramid search is faster than either, so FFT is only picked without it.
+FFT_AREA_RANGE = (48 * 48, 128 * 128)
+
+
+class DetectionCancelled(Exception):
+    pass
+
+
+def detect_template(gray_img, gray_template, threshold=0.8, scales=DEFAULT_SCALES,
+                    use_pyramid=True, method=cv2.TM_CCOEFF_NORMED, workers=None,
+                    strip_rows=None, cache=None, progress=None, is_cancelled=None, backend="auto", ink=None,
+                    proposals=False, stats=None):
+    """Find every occurrence of gray_template in gray_img.
+
+    Returns (boxes, scores) where boxes is an (N, 4) int array of (x, y, w, h).
+    """
+    boxes, scores = collect_candidates(gray_img, gray_template, threshold, scales, use_pyramid, method,
+                                       workers, strip_rows, cache, progress, is_cancelled, backend, ink,
+                                       proposals, stats)
+    return filter_candidates(boxes, scores, threshold)
+
+
+def choose_backend(template_shape, use_pyramid=True, method=cv2.TM_CCOEFF_NORMED, backend="auto"):
+    """Resolve backend "auto" to "spatial" or "fft" from the template area.
+
+    The FFT backend only computes TM_CCOEFF_NORMED; other methods always
+    run spatially. "chamfer" is never picked automatically and ignores
+    method, since it scores distances rather than pixel values.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "chamfer":
+        return backend
+    if method != cv2.TM_CCOEFF_NORMED:
+        return "spatial"
+    if backend != "auto":
+        return backend
+    area = template_shape[0] * template_shape[1]
+    if use_pyramid or not FFT_AREA_RANGE[0] <= area <= FFT_AREA_RANGE[1]:
+        return "spatial"
+    return "fft"
+
+
+def filter_candidates(boxes, scores, threshold):
+    """Re-threshold a score-sorted candidate list and de-duplicate what is left.
+
+    Candidates collected at a lower threshold give exactly the boxes a fresh
+    detection at ``threshold`` would, without touching the page again.
+    """
+    count = int(np.searchsorted(-scores, -threshold, side="right"))
+    boxes, scores = boxes[:count], scores[:count]
+    keep = suppress_near(boxes, scores)
+    return boxes[keep], scores[keep]
+
+
+def candidates_key(page_hash, gray_template, threshold, scales=DEFAULT_SCALES, use_pyramid=True,
+                   method=cv2.TM_CCOEFF_NORMED, backend="auto", skip_blank=False, proposals=False):
+    """ResultCache key for collect_candidates on one page with one template and parameter set."""
+    params = dict(kind="template", threshold=round(float(threshold), 4), scales=[float(v) for v in scales],
+                  use_pyramid=bool(use_pyramid), method=int(method),
+                  backend=choose_backend(gray_template.shape, use_pyramid, method, backend))
+    if skip_blank:
+        params["skip_blank"] = True
+    if proposals:
+        params["proposals"] = True
+    return content_hash(page_hash, gray_template, params)
+
+
+def collect_candidates_cached(result_cache, page_hash, gray_img, gray_template, threshold=0.8,
+                              scales=DEFAULT_SCALES, use_pyramid=True, method=cv2.TM_CCOEFF_NORMED,
+                              backend="auto", **kwargs):
+    """collect_candidates backed by a ResultCache; result_cache may be None."""
+    if result_cache is None:
+        return collect_candidates(gray_img, gray_template, threshold, scales, use_pyramid, method,
+                                  backend=backend, **kwargs)
+    key = candidates_key(page_hash, gray_template, threshold, scales, use_pyramid, method, backend,
+                         kwargs.get("ink") is not None, kwargs.get("proposals", False))
+    hit = result_cache.get(key)
+    if hit is not None:
+        return hit["boxes"], hit["scores"]
+    boxes, scores = collect_candidates(gray_img, gray_template, threshold, scales, use_pyramid, method,
+                                      backend=backend, **kwargs)
+    result_cache.put(key, boxes=boxes, scores=scores)
+    return boxes, scores
+
+
+def collect_candidates(gray_img, gray_template, threshold=0.8, scales=DEFAULT_SCALES,
+                       use_pyramid=True, method=cv2.TM_CCOEFF_NORMED, workers=None,
+                       strip_rows=None, cache=None, progress=None, is_cancelled=None, backend="auto",
+                       ink=None, proposals=False, stats=None):
+    """Raw correlation peaks >= threshold over all scales, best score first.
+
+    Returns (boxes, scores) before de-duplication. The page is split into
+    halo-overlapped horizontal strips that run on a pool of ``workers``
+    threads (all cores by default). progress(done, total)
+    is reported per finished strip and is_cancelled() is polled between
+    strips; DetectionCancelled is raised when it returns True. When a
+    PageCache for the page is given, pyramid search reuses its reduced levels.
+
+    backend picks spatial matchTemplate (one job per scale and strip) or the
+    overlap-save FFT correlation (one job per strip for all scales, sharing
+    each tile's spectrum); "auto" chooses from the template size.
+    "chamfer" scores distances to the page's ink instead (see
+    symbolmatch.chamfer); it tolerates small size changes, so scales
+    within SCALE_TOLERANCE of one already searched are skipped.
+
+    With an InkMap of the page, positions whose window cannot hold half the
+    template's dark pixels are skipped; ink.stats() tells how much.
+
+    With proposals, the page's connected ink blobs that look like the
+    template's largest blob propose positions and only small windows around
+    them are correlated (one job per scale); a template without a blob wholly
+    inside it falls back to the search above. A stats dict, if given, receives the blob,
+    proposal and window counts and the correlated fraction of the page.
+    """
+    workers = workers or default_workers()
+    backend = choose_backend(gray_template.shape, use_pyramid, method, backend)
+    if backend == "chamfer":
+        scales = chamfer_scales(scales)
+
+    def cancelled():
+        return is_cancelled is not None and is_cancelled()
+
+    resized = []
+    for scale in scales:
+        tpl = gray_template if scale == 1.0 else cv2.resize(gray_template, None, fx=scale, fy=scale)
+        if tpl.shape[0] < gray_img.shape[0] and tpl.shape[1] < gray_img.shape[1]:
+            resized.append(tpl)
+
+    anchored = proposals and template_anchor(gray_template) is not None
+    if proposals and not anchored and stats is not None:
+        stats["fallback"] = True
+    if anchored:
+        jobs, run = _proposal_jobs(gray_img, resized, threshold, method, cache, stats)
+    elif backend == "fft":
+        jobs, run = _fft_jobs(gray_img, resized, threshold, workers, strip_rows, cancelled, ink)
+    elif backend == "chamfer":
+        jobs, run = _chamfer_jobs(gray_img, resized, threshold, workers, strip_rows, cache, ink)
+    else:
+        jobs, run = _spatial_jobs(gray_img, resized, threshold, use_pyramid, method, workers, strip_rows, cache,
+                                  ink)
+
+    results = []
+    if workers == 1:
+        for job in jobs:
+            if cancelled():
+                raise DetectionCancelled()
+            results.append(run(job))
+            if progress is not None:
+                progress(len(results), len(jobs))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = {pool.submit(run, job) for job in jobs}
+            while pending:
+                finished, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                results.extend(f.result() for f in finished)
+                if cancelled():
+                    for f in pending:
+                        f.cancel()
+                    raise DetectionCancelled()
+                if finished and progress is not None:
+                    progress(len(results), len(jobs))
+
+    if not results:
+        return np.empty((0, 4), np.intp), np.empty(0, np.float32)
+    boxes = np.concatenate([b for b, _ in results]).astype(np.intp)
+    scores = np.concatenate([s for _, s in results])
+    order = np.argsort(-scores, kind="stable")
+    return boxes[order], scores[order]
+
+
+def _spatial_jobs(gray_img, templates, threshold, use_pyramid, method, workers, strip_rows, cache, ink):
+    match = match_pyramid if use_pyramid else match_full
+    page_h = gray_img.shape[0]
+    jobs = []
+    for resized in templates:
+        r_h, r_w = resized.shape[:2]
+        rows = strip_rows or strip_rows_for(page_h, r_h, workers)
+        radius = max(1, min(r_w, r_h) // 4)
+        levels = pyramid_levels(resized.shape) if use_pyramid else 0
+        if ink is None:
+            regions = [(y0, y1, 0, gray_img.shape[1] - r_w + 1) for y0, y1 in page_strips(page_h, r_h, rows)]
+        else:
+            regions = ink.regions(resized.shape, min_ink_for(resized, dark=ink.dark), band_rows_for(r_h, rows))
+        for y0, y1, x0, x1 in regions:
+            jobs.append((resized, y0, y1, x0, x1, radius, levels))
+
+    def run(job):
+        resized, y0, y1, x0, x1, radius, levels = job
+        kwargs = {}
+        f = 2 ** levels
+        if cache is not None and levels and y0 % f == 0 and x0 % f == 0:
+            r_h, r_w = resized.shape[:2]
+            kwargs = dict(levels=levels, coarse_img=cache.pyramid(levels)[y0 // f:-(-(y1 + r_h - 1) // f),
+                                                                        x0 // f:-(-(x1 + r_w - 1) // f)])
+        xs, ys, scores = match_strip(gray_img, resized, y0, y1, threshold, method, radius, match, x0, x1, **kwargs)
+        r_h, r_w = resized.shape[:2]
+        return np.column_stack([xs, ys, np.full(len(xs), r_w), np.full(len(xs), r_h)]), scores
+
+    return jobs, run
+
+
+def _chamfer_jobs(gray_img, templates, threshold, workers, strip_rows, cache, ink):
+    dist = cache.distance() if cache is not None else distance_map(gray_img)
+    page_h = gray_img.shape[0]
+    jobs = []
+    for resized in templates:
+        r_h, r_w = resized.shape[:2]
+        rows = strip_rows or strip_rows_for(page_h, r_h, workers)
+        if ink is None:
+            regions = [(y0, y1, 0, gray_img.shape[1] - r_w + 1) for y0, y1 in page_strips(page_h, r_h, rows)]
+        else:
+            regions = ink.regions(resized.shape, min_ink_for(resized, dark=ink.dark), band_rows_for(r_h, rows))
+        for y0, y1, x0, x1 in regions:
+            jobs.append((resized, y0, y1, x0, x1))
+
+    def run(job):
+        resized, y0, y1, x0, x1 = job
+        r_h, r_w = resized.shape[:2]
+        xs, ys, scores = match_strip(dist, resized, y0, y1, threshold, None, max(1, min(r_w, r_h) // 4),
+                                     match_chamfer, x0, x1)
+        return np.column_stack([xs, ys, np.full(len(xs), r_w), np.full(len(xs), r_h)]), scores
+
+    return jobs, run
+
+
+def _proposal_jobs(gray_img, templates, threshold, method, cache, stats):
+    components = cache.components() if cache is not None else ink_components(gray_img)
+    page_h, page_w = gray_img.shape[:2]
+    jobs = []
+    counts = dict(blobs=len(components), proposals=0, windows=0, area=0, total=0)
+    for resized in templates:
+        r_h, r_w = resized.shape[:2]
+        res_h, res_w = page_h - r_h + 1, page_w - r_w + 1
+        anchor = template_anchor(resized)
+        if anchor is None:
+            continue
+        xs, ys = propose(components, anchor)
+        # Room for the anchor to sit a little off its place in the template
+        margin = max(4, max(r_h, r_w) // 8)
+        windows = proposal_windows(xs, ys, (res_h, res_w), margin)
+        counts["proposals"] += len(xs)
+        counts["windows"] += len(windows)
+        counts["area"] += sum(int(min(x1, res_w) - x0) * int(min(y1, res_h) - y0) for x0, y0, x1, y1 in windows)
+        counts["total"] += res_h * res_w
+        jobs.append((resized, windows))
+    if stats is not None:
+        stats.update(counts, correlated=counts["area"] / counts["total"] if counts["total"] else 0.0)
+
+    def run(job):
+        resized, windows = job
+        r_h, r_w = resized.shape[:2]
+        xs, ys, scores = match_windows(gray_img, resized, windows, threshold, method, max(1, min(r_w, r_h) // 4))
+        return np.column_stack([xs, ys, np.full(len(xs), r_w), np.full(len(xs), r_h)]), scores
+
+    return jobs, run
+
+
+def _fft_jobs(gray_img, templates, threshold, workers, strip_rows, cancelled, ink):
+    if not templates:
+        return [], None
+    page_h, page_w = gray_img.shape[:2]
+    max_h = max(t.shape[0] for t in templates)
+    max_w = max(t.shape[1] for t in templates)
+    # Every scale is searched over the positions of the smallest one
+    res_h = page_h - min(t.shape[0] for t in templates) + 1
+    res_w = page_w - min(t.shape[1] for t in templates) + 1
+    # Whole tiles per strip, so strips do not pay for half-empty transforms
+    step = tile_size_for((max_h, max_w)) - max_h + 1
+    rows = strip_rows or strip_rows_for(page_h, max_h, workers)
+    rows = -(-rows // step) * step
+    if ink is None:
+        jobs = [(y0, y1, 0, res_w) for y0, y1 in page_strips(page_h, page_h - res_h + 1, rows)]
+    else:
+        min_ink = min(min_ink_for(t, dark=ink.dark) for t in templates)
+        jobs = list(ink.regions((max_h, max_w), min_ink, step, result_shape=(res_h, res_w)))
+    radii = [max(1, min(t.shape[:2]) // 4) for t in templates]
+    # Template transforms shared by every job; a race only computes one twice
+    spectra = {}
+
+    def run(job):
+        y0, y1, x0, x1 = job
+        region = gray_img[y0:y1 + max_h - 1, x0:x1 + max_w - 1]
+        peaks = match_many_fft(region, templates, threshold, radii, is_cancelled=cancelled, spectra=spectra)
+        if peaks is None:
+            raise DetectionCancelled()
+        boxes, scores = [], []
+        for tpl, (xs, ys, sc) in zip(templates, peaks):
+            # Larger scales leave smaller ones valid positions past the job; the next job owns them
+            inside = (ys < y1 - y0) & (xs < x1 - x0)
+            xs, ys, sc = xs[inside], ys[inside], sc[inside]
+            r_h, r_w = tpl.shape[:2]
+            boxes.append(np.column_stack([xs + x0, ys + y0, np.full(len(xs), r_w), np.full(len(xs), r_h)]))
+            scores.append(sc)
+        return np.concatenate(boxes), np.concatenate(scores)
+
+    return jobs, run
@@ -0,0 +1,149 @@
+"""Headless batch detection of one template over many page images."""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from symbolmatch.adaptive import BUDGET, detect_adaptive
+from symbolmatch.binary import TM_BINARY
+from symbolmatch.cascade import cascade_match
+from symbolmatch.detect import DEFAULT_SCALES, detect_template
+from symbolmatch.features import DetectionFailed, detect_orb_homography, detect_sift_clusters
+from symbolmatch.ink import InkMap
+from symbolmatch.result_cache import ResultCache, content_hash
+
+METHODS = ("template", "binary", "sift", "orb", "cascade")
+# matchTemplate method behind each template-search METHODS entry
+TEMPLATE_METHODS = {"template": cv2.TM_CCOEFF_NORMED, "binary": TM_BINARY}
+
+
+def load_gray(path, box=None):
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise FileNotFoundError(f"Could not read image: {path}")
+    if box is not None:
+        x, y, w, h = box
+        gray = gray[y:y + h, x:x + w].copy()
+    return gray
+
+
+def detect_gray(gray_img, gray_template, method="template", threshold=0.8, scales=DEFAULT_SCALES,
+                use_pyramid=True, workers=None, backend="auto", ink=None, proposals=False, stats=None,
+                scale_range=None, budget=BUDGET):
+    """Run one detection method on an in-memory page; returns (boxes, scores) lists.
+
+    ink is an optional InkMap of gray_img used to skip blank paper;
+    proposals verifies only around blobs shaped like the template and
+    fills the optional stats dict with its counts. "binary" is the
+    template search scored on 1-bit ink masks (see symbolmatch.binary).
+
+    With scale_range (lo, hi), template search probes that whole range
+    instead of scales and refines within budget (see symbolmatch.adaptive);
+    stats then also receives "scales", the scale of every returned box.
+
+    "cascade" verifies blob and keypoint proposals with windowed
+    correlation and homographies (see symbolmatch.cascade); stats receives
+    the time and candidate count of every stage.
+    """
+    if method in TEMPLATE_METHODS and scale_range is not None:
+        stats = {} if stats is None else stats
+        boxes, scores, found = detect_adaptive(gray_img, gray_template, threshold, scale_range, budget,
+                                               TEMPLATE_METHODS[method], stats=stats)
+        stats["scales"] = [round(float(s), 4) for s in found]
+        return [tuple(int(v) for v in b) for b in boxes], [float(s) for s in scores]
+    if method in TEMPLATE_METHODS:
+        boxes, scores = detect_template(gray_img, gray_template, threshold, scales, use_pyramid,
+                                        TEMPLATE_METHODS[method], workers=workers, backend=backend, ink=ink, proposals=proposals,
+                                        stats=stats)
+        return [tuple(int(v) for v in b) for b in boxes], [float(s) for s in scores]
+    if method == "cascade":
+        boxes, scores = cascade_match(gray_img, gray_template, threshold, stats=stats)
+        return [tuple(int(v) for v in b) for b in boxes], [float(s) for s in scores]
+    if method == "sift":
+        return detect_sift_clusters(gray_img, gray_template)
+    if method == "orb":
+        return detect_orb_homography(gray_img, gray_template)
+    raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}")
+
+
+def detect_gray_cached(result_cache, gray_img, gray_template, method="template", **options):
+    """detect_gray backed by a ResultCache; returns (boxes, scores, cache_hit)."""
+    params = {k: v for k, v in options.items() if k not in ("workers", "ink", "stats")}
+    if options.get("ink") is not None:
+        params["skip_blank"] = True
+    key = content_hash(gray_img, gray_template, dict(method=method, **params))
+    hit = result_cache.get(key)
+    stats = options.get("stats")
+    if hit is not None:
+        if "scales" in hit and stats is not None:
+            stats["scales"] = [float(s) for s in hit["scales"]]
+        return [tuple(int(v) for v in b) for b in hit["boxes"]], [float(s) for s in hit["scores"]], True
+    boxes, scores = detect_gray(gray_img, gray_template, method, **options)
+    arrays = dict(boxes=np.asarray(boxes, np.int64).reshape(-1, 4), scores=np.asarray(scores, np.float64))
+    if stats is not None and "scales" in stats:
+        arrays["scales"] = np.asarray(stats["scales"], np.float64)
+    result_cache.put(key, **arrays)
+    return boxes, scores, False
+
+
+def detect_page(page_path, gray_template, method="template", cache_dir=None, skip_blank=True, **options):
+    """Detect gray_template on the page image at page_path and return a result dict.
+
+    With cache_dir, results are reused from (and stored in) a ResultCache there.
+    With skip_blank, template search leaves out blank paper and the result
+    records the skipped fraction of the page. With scale_range, every box
+    records the template scale it was found at.
+    """
+    started = time.perf_counter()
+    result = {"page": page_path, "method": method, "boxes": [], "error": None, "cached": False, "skipped": 0.0}
+    try:
+        gray_img = load_gray(page_path)
+        result["height"], result["width"] = gray_img.shape[:2]
+        ink = InkMap(gray_img) if skip_blank and method in TEMPLATE_METHODS else None
+        if ink is not None:
+            options["ink"] = ink
+        if options.get("scale_range") is not None:
+            options["stats"] = result["adaptive"] = {}
+        elif options.get("proposals"):
+            options["stats"] = result["proposals"] = {}
+        elif method == "cascade":
+            options["stats"] = result["cascade"] = {}
+        if cache_dir is None:
+            boxes, scores = detect_gray(gray_img, gray_template, method, **options)
+        else:
+            boxes, scores, result["cached"] = detect_gray_cached(
+                ResultCache(cache_dir), gray_img, gray_template, method, **options)
+        result["boxes"] = [
+            {"x": x, "y": y, "w": w, "h": h, "score": round(score, 4)}
+            for (x, y, w, h), score in zip(boxes, scores)
+        ]
+        if "adaptive" in result:
+            for box, scale in zip(result["boxes"], result["adaptive"].pop("scales", [])):
+                box["scale"] = scale
+        if ink is not None:
+            result["skipped"] = round(ink.stats()["skipped"], 3)
+    except (DetectionFailed, FileNotFoundError) as e:
+        result["error"] = str(e)
+    result["elapsed"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def detect_pages(gray_template, page_paths, method="template", processes=None, **options):
+    """Detect over many pages on a process pool, yielding each result as soon as its page finishes.
+
+    Each process searches its page single-threaded so the pool, not the
+    per-page strip threads, owns the cores.
+    """
+    processes = processes or os.cpu_count() or 1
+    if method in TEMPLATE_METHODS:
+        options.setdefault("workers", 1)
+    if processes == 1 or len(page_paths) < 2:
+        for path in page_paths:
+            yield detect_page(path, gray_template, method, **options)
+        return
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(detect_page, path, gray_template, method, **options) for path in page_paths]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,112 @@
+"""Keypoint-based symbol detection (SIFT clusters, ORB homography, verified instances)."""
+import cv2
+import numpy as np
+
+from symbolmatch.cluster import dbscan
+from symbolmatch.descriptor_match import match_descriptors, match_repeated
+from symbolmatch.instances import find_instances
+from symbolmatch.scene_features import TILE, create_detector, keypoint_geometry
+
+
+class DetectionFailed(Exception):
+    pass
+
+
+def scene_or_detect(kind, nfeatures, gray_img, scene):
+    """(points, descriptors) of the page: scene as given (see SceneFeatures.get) or detected now, tile by tile."""
+    if scene is not None:
+        return scene
+    kp, des = create_detector(kind, nfeatures, TILE).detectAndCompute(gray_img, None)
+    return cv2.KeyPoint_convert(kp).reshape(-1, 2), des
+
+
+def detect_sift_clusters(gray_img, gray_template, ratio=0.7, eps=25, min_samples=3, scene=None, stats=None):
+    """Cluster SIFT matches on the page and return one template-sized box per cluster.
+
+    scene is the page's precomputed SIFT (points, descriptors), as
+    SceneFeatures.get returns them; without it the page is detected here.
+    Returns (boxes, scores); the score is the number of matches in the cluster.
+    A stats dict, if given, receives the match and cluster counts.
+    """
+    h, w = gray_template.shape[:2]
+    sift = cv2.SIFT_create()
+    kp1, des1 = sift.detectAndCompute(gray_template, None)
+    pts2, des2 = scene_or_detect("sift", 0, gray_img, scene)
+
+    if des1 is None or des2 is None or len(kp1) < 4 or len(pts2) < 10:
+        raise DetectionFailed("Not enough features to detect.")
+
+    _, train_idx, _ = match_descriptors(des1, des2, ratio)
+    if stats is not None:
+        stats.update(matches=len(train_idx), clusters=0)
+
+    boxes, scores = [], []
+    if len(train_idx) >= 4:
+        match_coords = pts2[train_idx]
+        labels = dbscan(match_coords, eps, min_samples)
+        if stats is not None:
+            stats["clusters"] = int(labels.max()) + 1
+
+        for label in set(labels):
+            if label == -1:
+                continue
+            cluster_pts = match_coords[labels == label]
+            cx, cy = np.mean(cluster_pts, axis=0)
+            boxes.append((int(cx - w / 2), int(cy - h / 2), w, h))
+            scores.append(float(len(cluster_pts)))
+    return boxes, scores
+
+
+def detect_orb_homography(gray_img, gray_template, nfeatures=5000, min_matches=10, scene=None):
+    """Locate one (possibly rotated or scaled) instance with ORB and a RANSAC homography.
+
+    scene is the page's precomputed ORB (points, descriptors), as for
+    detect_sift_clusters. Returns ([box], [inlier count]).
+    """
+    orb = cv2.ORB_create(nfeatures)
+    kp1, des1 = orb.detectAndCompute(gray_template, None)
+    pts2, des2 = scene_or_detect("orb", nfeatures, gray_img, scene)
+
+    if des1 is None or des2 is None:
+        raise DetectionFailed("Not enough features detected.")
+
+    query_idx, train_idx, _ = match_descriptors(des1, des2, ratio=None, cross_check=True)
+
+    if len(query_idx) < min_matches:
+        raise DetectionFailed("Not enough good matches.")
+
+    src_pts = cv2.KeyPoint_convert(kp1)[query_idx].reshape(-1, 1, 2)
+    dst_pts = pts2[train_idx].reshape(-1, 1, 2)
+
+    M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
+    if M is None:
+        raise DetectionFailed("Failed to compute homography.")
+
+    h, w = gray_template.shape[:2]
+    pts = np.float32([[0, 0], [0, h], [w, h], [w, 0]]).reshape(-1, 1, 2)
+    dst = cv2.perspectiveTransform(pts, M)
+    return [tuple(int(v) for v in cv2.boundingRect(dst))], [float(mask.sum())]
+
+
+def detect_instances(gray_img, gray_template, kind="orb", nfeatures=5000, ratio=0.75, scene=None, stats=None):
+    """Every rotated or scaled instance of the template, verified geometrically (see symbolmatch.instances).
+
+    kind is "orb" or "sift". scene is the page's precomputed
+    (geometry, descriptors), as SceneFeatures.geometry returns them.
+    Returns (boxes, scores); the score is the instance's inlier count.
+    A stats dict, if given, receives the match and instance counts.
+    """
+    keypoints, des1 = create_detector(kind, nfeatures).detectAndCompute(gray_template, None)
+    if scene is None:
+        page_keypoints, des2 = create_detector(kind, nfeatures, TILE).detectAndCompute(gray_img, None)
+        scene = keypoint_geometry(page_keypoints), des2
+    geometry, des2 = scene
+
+    if des1 is None or des2 is None or len(keypoints) < 4:
+        raise DetectionFailed("Not enough features detected.")
+
+    query_idx, train_idx = match_repeated(des1, des2, ratio)
+    instances = find_instances(keypoint_geometry(keypoints), geometry, query_idx, train_idx, gray_template.shape)
+    if stats is not None:
+        stats.update(matches=len(query_idx), instances=len(instances))
+    return [i.box for i in instances], [float(i.inliers) for i in instances]
@@ -0,0 +1,139 @@
+"""Frequency-domain TM_CCOEFF_NORMED with overlap-save page tiles.
+
+The page is cut into square tiles of DFT size S that overlap by the largest
+template minus one pixel, so each tile yields S - (t - 1) fully valid rows
+and columns of correlation. Each tile is transformed once and its spectrum,
+together with the tile's sum and squared-sum integral images, is shared by
+every template in the batch. The numerator sum(I * (T - mean T)) comes from
+one spectrum product and inverse DFT; the window statistics for the
+denominator come from the integrals, computed once per template size.
+"""
+import cv2
+import numpy as np
+
+from symbolmatch.peaks import find_peaks
+
+
+def tile_size_for(max_template_shape, tile=512):
+    """DFT size of one overlap-save tile: at least tile and four template sizes."""
+    return cv2.getOptimalDFTSize(max(tile, 4 * max(max_template_shape[:2])))
+
+
+class TemplateSpectrum:
+    """Zero-mean template and its DFT at tile size S."""
+
+    def __init__(self, gray_template, size):
+        t = gray_template.astype(np.float32)
+        t -= t.mean()
+        self.shape = gray_template.shape[:2]
+        self.norm = float(np.sqrt(np.sum(t.astype(np.float64) ** 2)))
+        padded = np.zeros((size, size), np.float32)
+        padded[:self.shape[0], :self.shape[1]] = t
+        self.spectrum = cv2.dft(padded)
+
+
+def page_tiles(page_shape, max_template_shape, size):
+    """Yield (y, x) origins of overlap-save tiles covering every result position."""
+    step_y = size - max_template_shape[0] + 1
+    step_x = size - max_template_shape[1] + 1
+    res_h = page_shape[0] - max_template_shape[0] + 1
+    res_w = page_shape[1] - max_template_shape[1] + 1
+    # Smaller templates have more valid positions than the largest one
+    for y in range(0, max(res_h, 1) + max_template_shape[0] - 1, step_y):
+        for x in range(0, max(res_w, 1) + max_template_shape[1] - 1, step_x):
+            yield y, x, step_y, step_x
+
+
+def _window_inv_norm(sums, sqsums, th, tw, out_h, out_w):
+    """1 / sqrt(sum (I - mean I)^2) for every th x tw window whose origin is in the tile."""
+    s1 = _box_sums(sums, th, tw, out_h, out_w)
+    s2 = _box_sums(sqsums, th, tw, out_h, out_w)
+    floor = np.maximum(1e-5 * s2, 0.5)
+    s1 *= s1
+    s1 /= th * tw
+    s2 -= s1
+    # Near-flat windows have no meaningful correlation and float32 round-off
+    # would dominate the ratio; score them 0 instead of letting noise peak
+    flat = s2 <= floor
+    var = s2.astype(np.float32)
+    var[flat] = 1.0
+    inv = 1.0 / np.sqrt(var)
+    inv[flat] = 0.0
+    return inv
+
+
+def _box_sums(integral, th, tw, out_h, out_w):
+    s = integral[th:th + out_h, tw:tw + out_w] - integral[:out_h, tw:tw + out_w]
+    s -= integral[th:th + out_h, :out_w]
+    s += integral[:out_h, :out_w]
+    return s
+
+
+def match_many_fft(gray_img, templates, threshold, peak_radius=1, tile=512, is_cancelled=None, spectra=None):
+    """TM_CCOEFF_NORMED peaks of every template in one overlap-save pass over the page.
+
+    templates is a list of gray uint8 images and peak_radius an int or one
+    radius per template; returns a list of (xs, ys, scores) per template, in
+    page coordinates, or None when is_cancelled() turns True. spectra is an
+    optional dict, kept by the caller for one templates list, in which the
+    template transforms are stored so later calls (other regions or pages)
+    reuse them.
+    """
+    page_h, page_w = gray_img.shape[:2]
+    radii = [peak_radius] * len(templates) if np.isscalar(peak_radius) else list(peak_radius)
+    usable = [i for i, t in enumerate(templates) if t.shape[0] <= page_h and t.shape[1] <= page_w]
+    parts = [([], [], []) for _ in templates]
+    if not usable:
+        return [_empty() for _ in templates]
+
+    max_shape = (max(templates[i].shape[0] for i in usable), max(templates[i].shape[1] for i in usable))
+    size = tile_size_for(max_shape, tile)
+    spectra = {} if spectra is None else spectra
+    for i in usable:
+        if (i, size) not in spectra:
+            spectra[i, size] = TemplateSpectrum(templates[i], size)
+    spectra = {i: spectra[i, size] for i in usable}
+    usable = [i for i in usable if spectra[i].norm > 0]
+    sizes = sorted({spectra[i].shape for i in usable})
+
+    block = np.zeros((size, size), np.float32)
+    for y, x, step_y, step_x in page_tiles((page_h, page_w), max_shape, size):
+        if is_cancelled is not None and is_cancelled():
+            return None
+        src = gray_img[y:y + size, x:x + size]
+        block[:] = 0
+        block[:src.shape[0], :src.shape[1]] = src
+        tile_spectrum = cv2.dft(block)
+        sums, sqsums = cv2.integral2(src, sdepth=cv2.CV_64F)
+
+        inv_norms = {}
+        for th, tw in sizes:
+            out_h = min(step_y, page_h - th + 1 - y)
+            out_w = min(step_x, page_w - tw + 1 - x)
+            if out_h > 0 and out_w > 0:
+                inv_norms[th, tw] = (_window_inv_norm(sums, sqsums, th, tw, out_h, out_w), out_h, out_w)
+
+        for i in usable:
+            spec = spectra[i]
+            if spec.shape not in inv_norms:
+                continue
+            inv, out_h, out_w = inv_norms[spec.shape]
+            corr = cv2.idft(cv2.mulSpectrums(tile_spectrum, spec.spectrum, 0, conjB=True),
+                            flags=cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT)
+            score = corr[:out_h, :out_w]
+            score *= inv
+            score *= 1.0 / spec.norm
+            np.clip(score, -1.0, 1.0, out=score)
+            xs, ys, scores = find_peaks(score, threshold, radii[i])
+            parts[i][0].append(xs + x)
+            parts[i][1].append(ys + y)
+            parts[i][2].append(scores)
+
+    return [
+        (np.concatenate(xs), np.concatenate(ys), np.concatenate(sc)) if xs else _empty()
+        for xs, ys, sc in parts
+    ]
+
+
+def _empty():
+    return np.empty(0, np.intp), np.empty(0, np.intp), np.empty(0, np.float32)
@@ -0,0 +1,147 @@
+"""Ink-density map used to skip the blank paper of a drawing sheet.
+
+Dark pixels are counted per cell of CELL x CELL pixels and kept as an
+integral image over the cell grid, which is tiny even for a 70 MP sheet.
+From it an upper bound on the dark pixels of any window follows in O(1),
+so every search position whose window cannot hold a fraction of the
+template's ink is dropped before any correlation is computed.
+"""
+import numpy as np
+
+CELL = 8
+# Sheet linework is anti-aliased gray; anything visibly darker than paper counts
+DARK = 240
+# Band height that keeps skipped margins fine-grained without paying the halo too often
+BAND_ROWS = 256
+# A window needs at least this fraction of the template's dark pixels
+MIN_INK_FRACTION = 0.5
+
+
+def dark_pixels(gray_img, dark=DARK):
+    return int(np.count_nonzero(gray_img < dark))
+
+
+def band_rows_for(template_h, rows):
+    """Region band height for a search that would otherwise use strips of ``rows``."""
+    return min(rows, max(BAND_ROWS, 4 * template_h))
+
+
+def min_ink_for(gray_template, fraction=MIN_INK_FRACTION, dark=DARK):
+    """Dark pixels a window must hold to possibly match gray_template."""
+    return int(fraction * dark_pixels(gray_template, dark))
+
+
+class InkMap:
+    """Per-cell dark pixel counts of one page, with searched/skipped counters.
+
+    The counts are built on first use, so handing an InkMap to a search that
+    is answered from a result cache costs nothing.
+    """
+
+    def __init__(self, gray_img, dark=DARK, cell=CELL):
+        self.shape = gray_img.shape[:2]
+        self.dark = dark
+        self.cell = cell
+        self._gray = gray_img
+        self._integral = None
+        self.reset_stats()
+
+    @property
+    def integral(self):
+        if self._integral is None:
+            c = self.cell
+            h, w = self.shape
+            rows, cols = -(-h // c), -(-w // c)
+            mask = np.zeros((rows * c, cols * c), np.uint8)
+            mask[:h, :w] = self._gray < self.dark
+            counts = mask.reshape(rows, c, cols, c).sum(axis=(1, 3), dtype=np.int32)
+            integral = np.zeros((rows + 1, cols + 1), np.int64)
+            integral[1:, 1:] = counts.cumsum(axis=0).cumsum(axis=1)
+            self._integral, self._gray = integral, None
+        return self._integral
+
+    @property
+    def nbytes(self):
+        return self.integral.nbytes
+
+    def reset_stats(self):
+        self.searched = 0
+        self.total = 0
+
+    def stats(self):
+        """Search positions looked at and the fraction skipped since the last reset."""
+        skipped = 1.0 - self.searched / self.total if self.total else 0.0
+        return dict(searched=int(self.searched), total=int(self.total), skipped=float(skipped))
+
+    def ink_in(self, y0, x0, y1, x1):
+        """Upper bound on the dark pixels of page rows y0..y1-1, columns x0..x1-1."""
+        c = self.cell
+        ii = self.integral
+        cy0, cx0 = y0 // c, x0 // c
+        cy1, cx1 = min(-(-y1 // c), ii.shape[0] - 1), min(-(-x1 // c), ii.shape[1] - 1)
+        return int(ii[cy1, cx1] - ii[cy0, cx1] - ii[cy1, cx0] + ii[cy0, cx0])
+
+    def live_cells(self, template_shape, min_ink):
+        """Boolean cell grid: True where some window starting in the cell may hold min_ink.
+
+        Windows are template_shape sized and clipped at the page edge, so
+        the bound also covers any smaller window starting at the same place.
+        """
+        c = self.cell
+        ii = self.integral
+        rows, cols = ii.shape[0] - 1, ii.shape[1] - 1
+        # Windows starting anywhere in a cell reach at most this many cells
+        span_y = (c + template_shape[0] - 2) // c + 1
+        span_x = (c + template_shape[1] - 2) // c + 1
+        y0 = np.arange(rows)[:, None]
+        x0 = np.arange(cols)[None, :]
+        y1 = np.minimum(y0 + span_y, rows)
+        x1 = np.minimum(x0 + span_x, cols)
+        bound = ii[y1, x1] - ii[y0, x1] - ii[y1, x0] + ii[y0, x0]
+        return bound >= max(min_ink, 1)
+
+    def regions(self, template_shape, min_ink, rows, result_shape=None):
+        """Split the result grid into rectangles that together cover every live position.
+
+        Yields (y0, y1, x0, x1) result ranges in bands of at most ``rows``
+        rows (whole cells); inside a band, runs of live columns
+        closer than one template width are merged so the halo is not paid
+        twice. result_shape defaults to the positions of template_shape
+        itself; pass the smallest template's for a batch of sizes.
+        """
+        c = self.cell
+        t_h, t_w = template_shape[:2]
+        res_h, res_w = result_shape or (self.shape[0] - t_h + 1, self.shape[1] - t_w + 1)
+        if res_h <= 0 or res_w <= 0:
+            return
+        self.total += res_h * res_w
+        live = self.live_cells(template_shape, min_ink)[:-(-res_h // c), :-(-res_w // c)]
+        band = max(1, rows // c)
+        gap = -(-t_w // c)
+        for by in range(0, live.shape[0], band):
+            block = live[by:by + band]
+            for cx0, cx1 in _runs(block.any(axis=0), gap):
+                live_rows = np.flatnonzero(block[:, cx0:cx1].any(axis=1))
+                y0 = (by + live_rows[0]) * c
+                y1 = min(res_h, (by + live_rows[-1] + 1) * c)
+                x0, x1 = cx0 * c, min(res_w, cx1 * c)
+                self.searched += (y1 - y0) * (x1 - x0)
+                yield y0, y1, x0, x1
+
+
+def _runs(flags, gap):
+    """(start, stop) of the True runs in flags, merging runs separated by fewer than gap Falses."""
+    idx = np.flatnonzero(flags)
+    if not len(idx):
+        return []
+    breaks = np.flatnonzero(np.diff(idx) > gap)
+    starts = np.concatenate([idx[:1], idx[breaks + 1]])
+    stops = np.concatenate([idx[breaks], idx[-1:]]) + 1
+    return list(zip(starts.tolist(), stops.tolist()))
+
+
+def saved_seconds(elapsed, skipped):
+    """Wall time the skipped fraction would have cost at the rate of the searched part."""
+    if skipped >= 1.0:
+        return 0.0
+    return elapsed * skipped / (1.0 - skipped)
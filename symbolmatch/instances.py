@@ -0,0 +1,128 @@
+"""Every instance of a template among keypoint matches: Hough voting, then RANSAC per peak.
+
+A match between a template keypoint and a page keypoint fixes a whole
+similarity transform: the size ratio gives the scale, the angle difference
+the rotation, and with those the template's centre lands on one page
+position. Each match votes for the (x, y, scale, rotation) bin of that
+pose, and for the nearest neighbouring bin along every dimension as well,
+so poses near a bin edge still meet. Bins live in a sparse accumulator
+(np.unique over bin keys), so memory follows the number of matches, not
+the page size.
+
+Peaks are verified best first: a similarity transform is fitted to the
+peak's matches with cv2.estimateAffinePartial2D and a bounded number of
+RANSAC iterations, and its inliers are claimed so later peaks cannot reuse
+them. Voting and verification stay close to linear in the matches.
+"""
+import math
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from symbolmatch.nms import nms
+
+# Bin widths: this fraction of the template's longer side, a factor of two in scale, 30 degrees
+LOCATION_BIN = 0.25
+SCALE_BIN = 1.0
+ANGLE_BIN = 30.0
+# Matches a bin needs before it is verified, and inliers a verified pose needs
+MIN_VOTES = 3
+MIN_INLIERS = 4
+RANSAC_ITERS = 200
+# Reprojection error accepted by RANSAC, as a fraction of the template's longer side
+REPROJ = 0.05
+# Accepted poses stay within this scale factor of the template
+MAX_SCALE = 4.0
+
+# box is (x, y, w, h) around the transformed template; matrix maps template to page
+Instance = namedtuple("Instance", "box inliers scale angle matrix")
+
+
+def vote_poses(template_geometry, page_geometry, template_shape):
+    """(N, 4) float pose coordinates (x, y, log2 scale, angle) of the template centre, in bin units."""
+    h, w = template_shape[:2]
+    scale = page_geometry[:, 2] / np.maximum(template_geometry[:, 2], 1e-6)
+    angle = np.radians(page_geometry[:, 3] - template_geometry[:, 3])
+    # The template centre seen from the template keypoint, rotated and scaled onto the page
+    dx = (w - 1) / 2 - template_geometry[:, 0]
+    dy = (h - 1) / 2 - template_geometry[:, 1]
+    cos, sin = np.cos(angle) * scale, np.sin(angle) * scale
+    cx = page_geometry[:, 0] + cos * dx - sin * dy
+    cy = page_geometry[:, 1] + sin * dx + cos * dy
+    location = LOCATION_BIN * max(h, w)
+    return np.column_stack([cx / location, cy / location, np.log2(np.maximum(scale, 1e-6)) / SCALE_BIN,
+                            np.degrees(angle) % 360.0 / ANGLE_BIN])
+
+
+def find_instances(template_geometry, page_geometry, query_idx, train_idx, template_shape,
+                   min_votes=MIN_VOTES, min_inliers=MIN_INLIERS, iterations=RANSAC_ITERS, overlap_thresh=0.3):
+    """Instances of the template supported by the matches query_idx -> train_idx, most inliers first.
+
+    The geometries are keypoint_geometry rows (x, y, size, angle) of the
+    template and of the page; every match pairs template row query_idx[i]
+    with page row train_idx[i].
+    """
+    h, w = template_shape[:2]
+    if len(query_idx) < min_inliers:
+        return []
+    src = template_geometry[query_idx]
+    dst = page_geometry[train_idx]
+    poses = vote_poses(src, dst, template_shape)
+
+    # Each match votes for its own bin and the nearer neighbour along every dimension
+    base = np.floor(poses).astype(np.int64)
+    step = np.where(poses - base >= 0.5, 1, -1)
+    angle_bins = int(round(360.0 / ANGLE_BIN))
+    keys, owners = [], []
+    for corner in range(16):
+        pick = np.array([(corner >> d) & 1 for d in range(4)])
+        key = base + step * pick
+        key[:, 3] %= angle_bins
+        keys.append(key)
+        owners.append(np.arange(len(poses)))
+    keys = np.concatenate(keys)
+    owners = np.concatenate(owners)
+    # One int64 per bin, so the accumulator is a flat np.unique
+    keys -= keys.min(axis=0)
+    spans = keys.max(axis=0) + 1
+    flat = ((keys[:, 0] * spans[1] + keys[:, 1]) * spans[2] + keys[:, 2]) * spans[3] + keys[:, 3]
+    bins, inverse, counts = np.unique(flat, return_inverse=True, return_counts=True)
+
+    # Matches of every bin with enough votes, largest bins first
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(inverse, minlength=len(bins)))])
+    peaks = np.flatnonzero(counts >= min_votes)
+    peaks = peaks[np.argsort(-counts[peaks], kind="stable")]
+
+    template_pts = src[:, :2].astype(np.float32)
+    page_pts = dst[:, :2].astype(np.float32)
+    corners = np.float32([[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]])
+    claimed = np.zeros(len(poses), bool)
+    found, boxes, scores = [], [], []
+    for peak in peaks:
+        members = owners[order[bounds[peak]:bounds[peak + 1]]]
+        members = members[~claimed[members]]
+        if len(members) < min_inliers:
+            continue
+        matrix, mask = cv2.estimateAffinePartial2D(
+            template_pts[members], page_pts[members], method=cv2.RANSAC,
+            ransacReprojThreshold=REPROJ * max(h, w), maxIters=iterations, confidence=0.99)
+        if matrix is None:
+            continue
+        inliers = members[mask.ravel().astype(bool)]
+        scale = math.hypot(matrix[0, 0], matrix[1, 0])
+        if len(inliers) < min_inliers or not 1 / MAX_SCALE <= scale <= MAX_SCALE:
+            continue
+        claimed[inliers] = True
+        placed = (corners @ matrix[:, :2].T + matrix[:, 2]).astype(np.float32)
+        x, y, bw, bh = cv2.boundingRect(placed)
+        angle = math.degrees(math.atan2(matrix[1, 0], matrix[0, 0])) % 360.0
+        found.append(Instance((x, y, bw, bh), len(inliers), scale, angle, matrix))
+        boxes.append((x, y, x + bw - 1, y + bh - 1))
+        scores.append(len(inliers))
+
+    if not found:
+        return []
+    keep = nms(np.array(boxes), np.array(scores, np.float32), overlap_thresh)
+    return [found[i] for i in keep]
@@ -0,0 +1,64 @@
+"""Search a whole template set in one pass over the page."""
+import numpy as np
+
+from symbolmatch.fftcorr import match_many_fft, tile_size_for
+from symbolmatch.ink import min_ink_for
+from symbolmatch.nms import nms
+
+
+def match_templates(gray_img, templates, threshold, overlap_thresh=0.3, peak_radius=1, tile=512, ink=None,
+                    spectra=None):
+    """TM_CCOEFF_NORMED detections of every labelled template, de-duplicated together.
+
+    templates is an iterable of (label, gray_template) pairs; several entries
+    may share a label (rotations of one symbol, say). The page is tiled and
+    transformed once for the whole set and window statistics are computed
+    once per distinct template size, so N templates cost far less than N
+    separate matchTemplate calls. With an InkMap of the page, only regions
+    where some template's window may find enough ink are searched.
+    Template transforms are kept in spectra (see match_many_fft) across the
+    regions, and across calls when the caller passes the same dict.
+
+    Returns (boxes, scores, labels): an (N, 4) int array of inclusive corners
+    (x1, y1, x2, y2), as nms expects them, their scores and the label of
+    each box, best score first.
+    """
+    templates = list(templates)
+    images = [t for _, t in templates]
+    spectra = {} if spectra is None else spectra
+    boxes, scores, labels = [], [], []
+    max_h = max((t.shape[0] for t in images), default=0)
+    max_w = max((t.shape[1] for t in images), default=0)
+    for y0, y1, x0, x1 in _regions(gray_img.shape, images, tile, ink):
+        region = gray_img[y0:y1 + max_h - 1, x0:x1 + max_w - 1]
+        peaks = match_many_fft(region, images, threshold, peak_radius, tile, spectra=spectra)
+        for (label, tpl), (xs, ys, sc) in zip(templates, peaks):
+            # Positions past the region belong to the next one
+            inside = (ys < y1 - y0) & (xs < x1 - x0)
+            xs, ys, sc = xs[inside] + x0, ys[inside] + y0, sc[inside]
+            h, w = tpl.shape[:2]
+            boxes.append(np.column_stack([xs, ys, xs + w - 1, ys + h - 1]))
+            scores.append(sc)
+            labels.extend([label] * len(sc))
+    if not labels:
+        return np.empty((0, 4), np.intp), np.empty(0, np.float32), []
+
+    boxes = np.concatenate(boxes)
+    scores = np.concatenate(scores)
+    keep = nms(boxes, scores, overlap_thresh)
+    return boxes[keep], scores[keep], [labels[i] for i in keep]
+
+
+def _regions(page_shape, images, tile, ink):
+    """Result rectangles to search: the whole page, or its inked parts, over the smallest template's positions."""
+    images = [t for t in images if t.shape[0] <= page_shape[0] and t.shape[1] <= page_shape[1]]
+    if not images:
+        return []
+    res_h = page_shape[0] - min(t.shape[0] for t in images) + 1
+    res_w = page_shape[1] - min(t.shape[1] for t in images) + 1
+    if ink is None:
+        return [(0, res_h, 0, res_w)]
+    max_shape = (max(t.shape[0] for t in images), max(t.shape[1] for t in images))
+    min_ink = min(min_ink_for(t, dark=ink.dark) for t in images)
+    step = tile_size_for(max_shape, tile) - max_shape[0] + 1
+    return ink.regions(max_shape, min_ink, step, result_shape=(res_h, res_w))
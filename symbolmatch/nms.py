@@ -0,0 +1,80 @@
+"""Score-aware non-maximum suppression over grid buckets.
+
+Boxes are sorted by score once and bucketed into square cells at least as
+large as the biggest box, so a kept box only has to be compared with the
+candidates in its own and the eight neighbouring cells. Cost is dominated by
+the sort, roughly O(n log n) in the number of raw hits.
+"""
+import numpy as np
+
+
+def nms(boxes, scores, overlap_thresh=0.3):
+    """IoU suppression; boxes are (x1, y1, x2, y2) with inclusive corners.
+
+    Returns the indices of the kept boxes, best score first.
+    """
+    return _greedy(boxes, scores, _iou_overlap, overlap_thresh)
+
+
+def suppress_near(boxes, scores, frac=0.5):
+    """Suppress boxes whose top-left corner lies within frac * (w, h) of a better box.
+
+    Boxes are (x, y, w, h); this is the de-duplication rule the viewers use.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    corners = boxes.copy()
+    corners[:, 2:] += boxes[:, :2] - 1
+    return _greedy(corners, scores, _near_overlap, frac)
+
+
+def _iou_overlap(kept, cand, x1, y1, x2, y2, thresh):
+    w = np.maximum(0, np.minimum(x2[kept], x2[cand]) - np.maximum(x1[kept], x1[cand]) + 1)
+    h = np.maximum(0, np.minimum(y2[kept], y2[cand]) - np.maximum(y1[kept], y1[cand]) + 1)
+    inter = w * h
+    area_k = (x2[kept] - x1[kept] + 1) * (y2[kept] - y1[kept] + 1)
+    area_c = (x2[cand] - x1[cand] + 1) * (y2[cand] - y1[cand] + 1)
+    return inter / (area_k + area_c - inter) > thresh
+
+
+def _near_overlap(kept, cand, x1, y1, x2, y2, frac):
+    w = x2[cand] - x1[cand] + 1
+    h = y2[cand] - y1[cand] + 1
+    return (np.abs(x1[cand] - x1[kept]) < w * frac) & (np.abs(y1[cand] - y1[kept]) < h * frac)
+
+
+def _greedy(boxes, scores, overlaps, thresh):
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+    n = len(boxes)
+    if n == 0:
+        return np.empty(0, np.intp)
+
+    x1, y1, x2, y2 = boxes.T
+    cell = max(float((x2 - x1).max()), float((y2 - y1).max())) + 1
+    gx = np.floor(x1 / cell).astype(np.int64)
+    gy = np.floor(y1 / cell).astype(np.int64)
+    gx -= gx.min()
+    gy -= gy.min()
+    cols = int(gx.max()) + 3
+    cell_id = (gy + 1) * cols + (gx + 1)
+
+    # Bucket members are stored best-score-first so suppression order matches
+    # a plain greedy pass over the score-sorted list.
+    order = np.argsort(-scores, kind="stable")
+    by_cell = order[np.argsort(cell_id[order], kind="stable")]
+    ids, starts, counts = np.unique(cell_id[by_cell], return_index=True, return_counts=True)
+    buckets = {int(c): by_cell[s:s + k] for c, s, k in zip(ids, starts, counts)}
+    offsets = [dy * cols + dx for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+    suppressed = np.zeros(n, dtype=bool)
+    keep = []
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        base = int(cell_id[i])
+        near = [buckets[base + o] for o in offsets if base + o in buckets]
+        cand = np.concatenate(near) if len(near) > 1 else near[0]
+        cand = cand[~suppressed[cand]]
+        suppressed[cand[overlaps(i, cand, x1, y1, x2, y2, thresh)]] = True
+    return np.asarray(keep, dtype=np.intp)
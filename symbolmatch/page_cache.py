@@ -0,0 +1,107 @@
+"""Lazily filled per-page cache of derived images (gray, pyramid, ink, blobs, distances)."""
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from symbolmatch.chamfer import TRUNCATE, distance_map
+from symbolmatch.ink import DARK, InkMap
+from symbolmatch.proposals import ink_components
+from symbolmatch.result_cache import content_hash
+
+DEFAULT_BUDGET = 512 * 1024 * 1024
+
+
+class PageCache:
+    """Derived copies of one page image, built on first use and shared by later searches.
+
+    Entries are kept in least-recently-used order and evicted once their
+    total size exceeds budget bytes; an evicted entry is simply rebuilt the
+    next time it is asked for, and an entry larger than the whole budget is
+    never stored. All accessors are safe to call from worker
+    threads.
+    """
+
+    def __init__(self, image, budget=DEFAULT_BUDGET):
+        self.image = image
+        self.budget = budget
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.RLock()
+
+    @property
+    def shape(self):
+        return self.image.shape[:2]
+
+    @property
+    def nbytes(self):
+        return sum(self._sizes.values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+
+    def gray(self):
+        return self._get("gray", self._build_gray)
+
+    def content_hash(self):
+        """Hash of the page pixels, computed once; keys the on-disk ResultCache."""
+        return self._get("content_hash", lambda: content_hash(self.image))
+
+    def pyramid(self, level):
+        """The gray page reduced ``level`` times with cv2.pyrDown; level 0 is gray()."""
+        if level == 0:
+            return self.gray()
+        return self._get(("pyramid", level), lambda: cv2.pyrDown(self.pyramid(level - 1)))
+
+    def ink(self, dark=DARK):
+        """InkMap of the gray page: dark pixel counts used to skip blank paper."""
+        return self._get(("ink", dark), lambda: InkMap(self.gray(), dark))
+
+    def components(self, dark=DARK):
+        """Connected ink blobs of the gray page (see proposals.ink_components)."""
+        return self._get(("components", dark), lambda: ink_components(self.gray(), dark))
+
+    def distance(self, dark=DARK, truncate=TRUNCATE):
+        """Truncated distance of every pixel to the nearest ink (see chamfer.distance_map)."""
+        return self._get(("distance", dark, truncate), lambda: distance_map(self.gray(), dark, truncate))
+
+    def _build_gray(self):
+        if self.image.ndim == 2:
+            return self.image
+        return cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+
+    def _get(self, key, build):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            value = build()
+            size = _size_of(value)
+            if size > self.budget:
+                # Too big to keep at all on this page; hand it out uncached
+                return value
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._evict(keep=key)
+            return value
+
+    def _evict(self, keep):
+        while self.nbytes > self.budget and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            if key == keep:
+                self._entries.move_to_end(key)
+                continue
+            del self._entries[key]
+            del self._sizes[key]
+
+
+def _size_of(value):
+    if isinstance(value, np.ndarray) or hasattr(value, "nbytes"):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        # Non-array members are counted at a nominal 32 bytes
+        return sum(_size_of(v) if isinstance(v, (np.ndarray, tuple, list)) else 32 for v in value)
+    return 0
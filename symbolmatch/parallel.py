@@ -0,0 +1,91 @@
+"""Multi-core matchTemplate over halo-overlapped page strips.
+
+OpenCV releases the GIL inside matchTemplate, so a plain thread pool is
+enough to keep every core busy. Each strip carries a halo of one template
+height, so every position of a full-page run is scored by exactly one strip.
+
+The stitched peaks match a full-page run only up to float noise:
+matchTemplate sums a strip in a different order, scores differ by about
+1e-4, and where neighbouring positions nearly tie (a plateau along a line)
+a different one can win the peak. After the suppress_near de-duplication
+the viewers apply, every detection has a counterpart within its
+suppression distance with a score that close (see benchmarks/parallel_match.py).
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from symbolmatch.ink import band_rows_for
+from symbolmatch.pyramid import match_full
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def strip_rows_for(page_h, template_h, workers, min_rows=256, align=8):
+    """Strip height that gives every worker about two strips to balance load.
+
+    Rows are rounded up to a multiple of align so strip origins stay on
+    whole pixels of the cached pyramid levels.
+    """
+    res_h = max(1, page_h - template_h + 1)
+    rows = max(min_rows, -(-res_h // (2 * workers)))
+    return -(-rows // align) * align
+
+
+def page_strips(page_h, template_h, rows=1024):
+    """Split the result rows of a page into bands of at most ``rows`` rows.
+
+    Yields (y0, y1): result rows y0..y1-1, which need page rows
+    y0..y1 + template_h - 2, i.e. a halo of one template height.
+    """
+    res_h = page_h - template_h + 1
+    for y0 in range(0, res_h, rows):
+        yield y0, min(res_h, y0 + rows)
+
+
+def match_strip(gray_img, gray_template, y0, y1, threshold, method=cv2.TM_CCOEFF_NORMED,
+                peak_radius=1, match=match_full, x0=0, x1=None, **match_kwargs):
+    """Run match on result rows y0..y1-1 (and columns x0..x1-1) and return peaks in page coordinates."""
+    t_h, t_w = gray_template.shape[:2]
+    x1 = gray_img.shape[1] - t_w + 1 if x1 is None else x1
+    strip = gray_img[y0:y1 + t_h - 1, x0:x1 + t_w - 1]
+    xs, ys, scores = match(strip, gray_template, threshold, method, peak_radius=peak_radius, **match_kwargs)
+    return xs + x0, ys + y0, scores
+
+
+def match_tiled(gray_img, gray_template, threshold, method=cv2.TM_CCOEFF_NORMED, peak_radius=1,
+                match=match_full, workers=None, strip_rows=None, executor=None, ink=None, min_ink=0):
+    """Drop-in for match_full / match_pyramid that spreads the page over a thread pool.
+
+    Peaks agree with the single call up to float noise and near-ties (see
+    the module docstring). With an InkMap of the page, only regions whose windows may hold min_ink
+    dark pixels are searched.
+    """
+    workers = workers or default_workers()
+    t_h = gray_template.shape[0]
+    rows = strip_rows or strip_rows_for(gray_img.shape[0], t_h, workers)
+    if ink is None:
+        strips = [(y0, y1, 0, None) for y0, y1 in page_strips(gray_img.shape[0], t_h, rows)]
+    else:
+        strips = list(ink.regions(gray_template.shape, min_ink, band_rows_for(t_h, rows)))
+
+    def run(strip):
+        y0, y1, x0, x1 = strip
+        return match_strip(gray_img, gray_template, y0, y1, threshold, method, peak_radius, match, x0, x1)
+
+    if workers == 1 and executor is None:
+        parts = [run(s) for s in strips]
+    elif executor is not None:
+        parts = list(executor.map(run, strips))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(run, strips))
+
+    if not parts:
+        return np.empty(0, np.intp), np.empty(0, np.intp), np.empty(0, np.float32)
+    xs, ys, scores = zip(*parts)
+    return np.concatenate(xs), np.concatenate(ys), np.concatenate(scores)
@@ -0,0 +1,36 @@
+"""Local-maximum extraction from correlation maps."""
+import cv2
+import numpy as np
+
+
+def find_peaks(result, threshold, radius=1, tile=1024):
+    """Return (xs, ys, scores) of the local maxima of result that are >= threshold.
+
+    A position is a peak when it equals the maximum of its (2 * radius + 1)
+    square neighbourhood. The map is processed in tiles with a halo of radius
+    pixels so the dilated copy never has to be held for the whole page, and
+    tiles with nothing above the threshold are skipped outright.
+    """
+    result = np.asarray(result, dtype=np.float32)
+    h, w = result.shape[:2]
+    kernel = np.ones((2 * radius + 1, 2 * radius + 1), np.uint8)
+    xs_all, ys_all, scores_all = [], [], []
+
+    for y0 in range(0, h, tile):
+        y1 = min(h, y0 + tile)
+        for x0 in range(0, w, tile):
+            x1 = min(w, x0 + tile)
+            block = result[y0:y1, x0:x1]
+            if block.max() < threshold:
+                continue
+            hy0, hx0 = max(0, y0 - radius), max(0, x0 - radius)
+            halo = result[hy0:min(h, y1 + radius), hx0:min(w, x1 + radius)]
+            local_max = cv2.dilate(halo, kernel)[y0 - hy0:y1 - hy0, x0 - hx0:x1 - hx0]
+            ys, xs = np.nonzero((block >= threshold) & (block >= local_max))
+            xs_all.append(xs + x0)
+            ys_all.append(ys + y0)
+            scores_all.append(block[ys, xs])
+
+    if not xs_all:
+        return np.empty(0, np.intp), np.empty(0, np.intp), np.empty(0, np.float32)
+    return np.concatenate(xs_all), np.concatenate(ys_all), np.concatenate(scores_all)
@@ -0,0 +1,75 @@
+"""Connected-component proposals: where on a line drawing a template can sit.
+
+The sheet is binarized and split into connected ink blobs once. The
+template's largest blob (its anchor) fixes the size and pixel count a
+matching blob on the page must have and where the template origin lies
+relative to it, so every plausible page blob proposes one origin. Only small
+windows around the proposals are then correlated.
+
+This suits free-standing symbols; a symbol drawn touching a wire merges
+with the wire into one large blob and is not proposed.
+"""
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from symbolmatch.ink import DARK
+
+# Anchor bounding box and pixel count a page blob may deviate by
+SIZE_TOLERANCE = 0.25
+AREA_TOLERANCE = 0.5
+# Proposal origins are merged on a grid of this many pixels
+CELL = 4
+
+Anchor = namedtuple("Anchor", "x y w h area")
+
+
+def ink_components(gray_img, dark=DARK):
+    """(N, 5) int array of x, y, w, h, area for every 8-connected ink blob."""
+    binary = cv2.threshold(gray_img, dark - 1, 255, cv2.THRESH_BINARY_INV)[1]
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    return stats[1:count, :5]
+
+
+def template_anchor(gray_template, dark=DARK):
+    """The template's largest blob that lies wholly inside it, or None.
+
+    Blobs cut by the template border continue outside it, so their page
+    counterparts are larger and cannot anchor a proposal.
+    """
+    stats = ink_components(gray_template, dark)
+    t_h, t_w = gray_template.shape[:2]
+    inner = (stats[:, 0] > 0) & (stats[:, 1] > 0) \
+        & (stats[:, 0] + stats[:, 2] < t_w) & (stats[:, 1] + stats[:, 3] < t_h)
+    stats = stats[inner]
+    if not len(stats):
+        return None
+    best = np.lexsort((stats[:, 4], stats[:, 2] * stats[:, 3]))[-1]
+    return Anchor(*(int(v) for v in stats[best]))
+
+
+def propose(components, anchor, size_tol=SIZE_TOLERANCE, area_tol=AREA_TOLERANCE):
+    """Template origins (xs, ys) implied by page blobs shaped like the anchor."""
+    w, h, area = components[:, 2], components[:, 3], components[:, 4]
+    # Two pixels of slack so thin anchors survive anti-aliasing differences
+    ok = (np.abs(w - anchor.w) <= size_tol * anchor.w + 2) \
+        & (np.abs(h - anchor.h) <= size_tol * anchor.h + 2) \
+        & (np.abs(area - anchor.area) <= area_tol * anchor.area)
+    return components[ok, 0] - anchor.x, components[ok, 1] - anchor.y
+
+
+def proposal_windows(xs, ys, result_shape, margin, cell=CELL):
+    """Merge origins into result windows (x0, y0, x1, y1) that extend margin pixels around them."""
+    res_h, res_w = result_shape
+    inside = (xs > -margin) & (ys > -margin) & (xs < res_w + margin) & (ys < res_h + margin)
+    if not inside.any():
+        return []
+    xs = np.clip(xs[inside], 0, res_w - 1)
+    ys = np.clip(ys[inside], 0, res_h - 1)
+    grid = np.zeros((-(-res_h // cell), -(-res_w // cell)), np.uint8)
+    grid[ys // cell, xs // cell] = 1
+    reach = -(-margin // cell)
+    grid = cv2.dilate(grid, np.ones((2 * reach + 1, 2 * reach + 1), np.uint8))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(grid, connectivity=8)
+    return [(cx * cell, cy * cell, (cx + cw) * cell, (cy + ch) * cell) for cx, cy, cw, ch, _ in stats[1:count]]
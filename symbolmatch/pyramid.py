@@ -0,0 +1,104 @@
+"""Brute-force and coarse-to-fine (image pyramid) template search."""
+import cv2
+import numpy as np
+
+from symbolmatch.binary import TM_BINARY, match_template
+from symbolmatch.peaks import find_peaks
+
+
+def match_full(gray_img, gray_template, threshold, method=cv2.TM_CCOEFF_NORMED, peak_radius=1):
+    """Correlate the template over the whole page and return the (xs, ys, scores) peaks >= threshold."""
+    result = match_template(gray_img, gray_template, method)
+    return find_peaks(result, threshold, peak_radius)
+
+
+def pyramid_levels(template_shape, min_side=16, max_levels=3):
+    """Number of pyrDown steps that keep the template's short side >= min_side."""
+    side = min(template_shape[:2])
+    levels = 0
+    while levels < max_levels and side // 2 >= min_side:
+        side //= 2
+        levels += 1
+    return levels
+
+
+def match_pyramid(gray_img, gray_template, threshold, method=cv2.TM_CCOEFF_NORMED,
+                  levels=None, slack=0.2, min_side=16, peak_radius=1, coarse_img=None):
+    """Coarse-to-fine search with the same output as match_full.
+
+    The template and page are reduced with cv2.pyrDown, candidates are taken at
+    ``threshold - slack`` on the reduced page and only the windows around them
+    are correlated again at full resolution. Scores are therefore exact; a true
+    match is only missed if its coarse score falls below the relaxed threshold.
+    coarse_img may pass in the page already reduced ``levels`` times (see
+    PageCache.pyramid) so it is not rebuilt for every template. TM_BINARY
+    proposes with gray TM_CCOEFF_NORMED, since pyrDown washes thin lines out
+    of the ink threshold.
+    """
+    if levels is None:
+        levels = pyramid_levels(gray_template.shape, min_side)
+    if levels == 0:
+        return match_full(gray_img, gray_template, threshold, method, peak_radius)
+
+    small_img, small_tpl = gray_img, gray_template
+    for _ in range(levels):
+        if coarse_img is None:
+            small_img = cv2.pyrDown(small_img)
+        small_tpl = cv2.pyrDown(small_tpl)
+    if coarse_img is not None:
+        small_img = coarse_img
+    if small_tpl.shape[0] > small_img.shape[0] or small_tpl.shape[1] > small_img.shape[1]:
+        return match_full(gray_img, gray_template, threshold, method, peak_radius)
+
+    coarse = cv2.matchTemplate(small_img, small_tpl, cv2.TM_CCOEFF_NORMED if method == TM_BINARY else method)
+    mask = (coarse >= threshold - slack).astype(np.uint8)
+    if not mask.any():
+        return _empty()
+
+    # Grow each candidate by one coarse pixel to absorb pyrDown rounding, then
+    # refine every connected candidate region with one windowed matchTemplate.
+    mask = cv2.dilate(mask, np.ones((3, 3), np.uint8))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+    factor = 2 ** levels
+    windows = [((cx - 1) * factor, (cy - 1) * factor, (cx + cw + 1) * factor, (cy + ch + 1) * factor)
+               for cx, cy, cw, ch, _ in stats[1:count]]
+    return match_windows(gray_img, gray_template, windows, threshold, method, peak_radius)
+
+
+def match_windows(gray_img, gray_template, windows, threshold, method=cv2.TM_CCOEFF_NORMED, peak_radius=1):
+    """Correlate only the result windows (x0, y0, x1, y1) and return their peaks in page coordinates.
+
+    Windows are clipped to the valid result area; a position covered by
+    several windows is reported once.
+    """
+    t_h, t_w = gray_template.shape[:2]
+    res_h = gray_img.shape[0] - t_h + 1
+    res_w = gray_img.shape[1] - t_w + 1
+
+    xs_all, ys_all, scores_all = [], [], []
+    for x0, y0, x1, y1 in windows:
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(res_w, x1), min(res_h, y1)
+        if x0 >= x1 or y0 >= y1:
+            continue
+        roi = gray_img[y0:y1 + t_h - 1, x0:x1 + t_w - 1]
+        result = match_template(roi, gray_template, method)
+        xs, ys, scores = find_peaks(result, threshold, peak_radius)
+        xs_all.append(xs + x0)
+        ys_all.append(ys + y0)
+        scores_all.append(scores)
+
+    if not xs_all:
+        return _empty()
+    xs = np.concatenate(xs_all)
+    ys = np.concatenate(ys_all)
+    scores = np.concatenate(scores_all)
+
+    # Neighbouring regions can share refinement windows; keep each position once.
+    _, first = np.unique(ys.astype(np.int64) * res_w + xs, return_index=True)
+    return xs[first], ys[first], scores[first]
+
+
+def _empty():
+    return np.empty(0, np.intp), np.empty(0, np.intp), np.empty(0, np.float32)
@@ -0,0 +1,88 @@
+"""Background QThread that runs detect_template off the GUI thread."""
+import time
+
+import cv2
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from symbolmatch.adaptive import BUDGET, collect_adaptive_cached, filter_adaptive
+from symbolmatch.detect import DEFAULT_SCALES, DetectionCancelled, collect_candidates_cached, filter_candidates
+
+
+class DetectionWorker(QThread):
+    progress = pyqtSignal(int, int)
+    candidates_ready = pyqtSignal(object, object, object)
+    found = pyqtSignal(object, object, float)
+    cancelled = pyqtSignal(object)
+    failed = pyqtSignal(object, str)
+
+    def __init__(self, cache, box, threshold, use_pyramid=True, scales=DEFAULT_SCALES, floor=None,
+                 result_cache=None, backend="auto", skip_blank=True, proposals=False,
+                 method=cv2.TM_CCOEFF_NORMED, scale_range=None, budget=BUDGET, parent=None):
+        super().__init__(parent)
+        self.box = box
+        self._cache = cache
+        self._result_cache = result_cache
+        self._threshold = threshold
+        # Candidates are collected down to floor so the threshold can be lowered later
+        self._floor = threshold if floor is None else min(floor, threshold)
+        self._use_pyramid = use_pyramid
+        self._scales = scales
+        self._backend = backend
+        self._skip_blank = skip_blank
+        self._proposals = proposals
+        self._method = method
+        # Search every scale in this (lo, hi) range adaptively instead of scales
+        self._scale_range = scale_range
+        self._budget = budget
+        # Probe/refined scales of the last adaptive search, and the scale of each found box
+        self.adaptive_stats = {}
+        self.found_scales = []
+        # Blob, candidate and window counts of the last proposal search
+        self.proposal_stats = {}
+        self._ink = None
+        self._cancel = False
+
+    def cancel(self):
+        self._cancel = True
+
+    def is_cancelled(self):
+        return self._cancel
+
+    def ink_stats(self):
+        """InkMap.stats() of the last run, or None when blank paper is not skipped."""
+        return None if self._ink is None else self._ink.stats()
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            x, y, w, h = self.box
+            gray_img = self._cache.gray()
+            gray_template = gray_img[y:y + h, x:x + w]
+            if self._skip_blank:
+                # Built on the worker thread; the PageCache keeps it for later searches
+                self._ink = self._cache.ink()
+                self._ink.reset_stats()
+            if self._scale_range is not None:
+                cand_boxes, cand_scores, cand_scales = collect_adaptive_cached(
+                    self._result_cache, self._cache.content_hash(), gray_img, gray_template,
+                    self._floor, self._scale_range, self._budget, self._method, cache=self._cache,
+                    stats=self.adaptive_stats, progress=self.progress.emit, is_cancelled=self.is_cancelled,
+                )
+                boxes, _, scales = filter_adaptive(cand_boxes, cand_scores, cand_scales, self._threshold)
+                self.found_scales = [float(s) for s in scales]
+            else:
+                cand_boxes, cand_scores = collect_candidates_cached(
+                    self._result_cache, self._cache.content_hash(), gray_img, gray_template,
+                    self._floor, self._scales, self._use_pyramid, self._method, backend=self._backend,
+                    cache=self._cache, ink=self._ink, proposals=self._proposals, stats=self.proposal_stats,
+                    progress=self.progress.emit, is_cancelled=self.is_cancelled,
+                )
+                boxes, _ = filter_candidates(cand_boxes, cand_scores, self._threshold)
+        except DetectionCancelled:
+            self.cancelled.emit(self.box)
+            return
+        except Exception as e:
+            self.failed.emit(self.box, str(e))
+            return
+        self.candidates_ready.emit(self.box, cand_boxes, cand_scores)
+        self.found.emit(self.box, [tuple(int(v) for v in b) for b in boxes], time.perf_counter() - started)
@@ -0,0 +1,110 @@
+"""On-disk cache of detection results keyed by content hashes."""
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "symbolmatch", "results")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def content_hash(*parts):
+    """Hex digest over arrays (shape, dtype and pixels) and JSON-serialisable parameters."""
+    digest = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update(repr((part.shape, part.dtype.str)).encode())
+            digest.update(np.ascontiguousarray(part).data)
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+        digest.update(b"|")
+    return digest.hexdigest()
+
+
+def file_fingerprint(path):
+    """Cheap identity of a file (path, size, mtime) for keying on model weights."""
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, int(stat.st_mtime)]
+
+
+class ResultCache:
+    """Arrays stored as one .npz per key, evicted least-recently-used once over max_bytes.
+
+    A hit touches the file's mtime, so mtime order is recency order. Writes
+    go through a temporary file and os.replace, so several processes can
+    share one directory.
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, key):
+        """Dict of the arrays stored under key, or None."""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                value = {name: data[name] for name in data.files}
+            os.utime(path)
+        except (FileNotFoundError, OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, **arrays):
+        fd, tmp = tempfile.mkstemp(suffix=".npz.tmp", dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, self._path(key))
+        self._evict()
+
+    def clear(self):
+        for path, _, _ in self._entries():
+            _remove(path)
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npz"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in sorted(entries, key=lambda e: e[2]):
+            if total <= self.max_bytes:
+                break
+            _remove(path)
+            total -= size
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
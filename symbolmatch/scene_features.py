@@ -0,0 +1,263 @@
+"""Page keypoints and descriptors computed once per page and kept next to the image.
+
+Feature detection on a whole sheet costs seconds and depends only on the
+page, so the viewers start it on a background thread as soon as a page is
+loaded (SceneFeatures.start) and every later selection only pays for its
+template's features and the match. The result is written beside the image
+as a compressed .npz named after the page's content hash, detector and
+OpenCV version, so reopening the sheet loads it instead of detecting again.
+
+Large sheets are detected in overlapping tiles (TiledDetector), each with
+its share of the feature budget, so keypoints cover the whole drawing
+rather than bunching in its busiest corner, and the tiles run in parallel.
+"""
+import glob
+import math
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from symbolmatch.ink import dark_pixels
+from symbolmatch.parallel import default_workers
+from symbolmatch.result_cache import content_hash
+
+DETECTORS = {"sift": cv2.SIFT_create, "orb": cv2.ORB_create}
+# Side of the area each tile owns, and the margin of neighbouring pixels it also sees
+TILE = 1024
+OVERLAP = 64
+# SIFT needs about 170 MB per 1024-pixel tile; more workers would only add memory
+MAX_WORKERS = 8
+
+
+def create_detector(kind, nfeatures=0, tile=None):
+    """A SIFT or ORB detector; nfeatures=0 keeps the detector's own default.
+
+    With tile, a TiledDetector spreading nfeatures over tiles of that size.
+    """
+    if kind not in DETECTORS:
+        raise ValueError(f"Unknown detector {kind!r}, expected one of {tuple(DETECTORS)}")
+    if tile:
+        return TiledDetector(kind, nfeatures, tile)
+    return DETECTORS[kind](nfeatures=nfeatures) if nfeatures else DETECTORS[kind]()
+
+
+class TiledDetector:
+    """Drop-in for a SIFT/ORB detector's detectAndCompute that works tile by tile.
+
+    The image is cut into tile-sized squares, each detected with OVERLAP
+    extra pixels around it so that keypoints near its edges still see
+    their whole neighbourhood. A tile keeps only the keypoints inside its
+    own square, which makes the merged set free of duplicates. nfeatures
+    is shared between tiles by their dark pixels, so blank paper costs
+    neither budget nor time (0: no limit beyond the detector's default per
+    tile). Tiles run on a thread pool; OpenCV releases the GIL while it
+    detects.
+    """
+
+    def __init__(self, kind, nfeatures=0, tile=TILE, overlap=OVERLAP, workers=None):
+        create_detector(kind)
+        self.kind = kind
+        self.nfeatures = nfeatures
+        self.tile = tile
+        self.overlap = overlap
+        self.workers = workers or min(default_workers(), MAX_WORKERS)
+
+    def tiles(self, image):
+        """(y0, y1, x0, x1, budget) of every square of image holding ink."""
+        h, w = image.shape[:2]
+        squares = [(y0, min(h, y0 + self.tile), x0, min(w, x0 + self.tile))
+                   for y0 in range(0, h, self.tile) for x0 in range(0, w, self.tile)]
+        ink = [dark_pixels(image[y0:y1, x0:x1]) for y0, y1, x0, x1 in squares]
+        total = sum(ink)
+        for (y0, y1, x0, x1), count in zip(squares, ink):
+            if count:
+                budget = math.ceil(self.nfeatures * count / total) if self.nfeatures else 0
+                yield y0, y1, x0, x1, budget
+
+    def detectAndCompute(self, image, mask=None):
+        """(keypoints, descriptors) in image coordinates, as cv2's detectAndCompute returns them."""
+        h, w = image.shape[:2]
+        if h <= self.tile and w <= self.tile:
+            return create_detector(self.kind, self.nfeatures).detectAndCompute(image, mask)
+
+        def run(square):
+            y0, y1, x0, x1, budget = square
+            # Pixels seen by this tile: its square plus the overlap, clipped to the image
+            oy, ox = max(0, y0 - self.overlap), max(0, x0 - self.overlap)
+            oy1, ox1 = min(h, y1 + self.overlap), min(w, x1 + self.overlap)
+            part_mask = None if mask is None else mask[oy:oy1, ox:ox1]
+            # Detectors keep state, so every tile gets its own
+            keypoints, descriptors = create_detector(self.kind, budget).detectAndCompute(
+                image[oy:oy1, ox:ox1], part_mask)
+            kept = []
+            for i, kp in enumerate(keypoints):
+                x, y = kp.pt[0] + ox, kp.pt[1] + oy
+                if x0 <= x < x1 and y0 <= y < y1:
+                    kp.pt = (x, y)
+                    kept.append(i)
+            if descriptors is None or not kept:
+                return [], None
+            return [keypoints[i] for i in kept], descriptors[kept]
+
+        squares = list(self.tiles(image))
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            parts = list(pool.map(run, squares))
+
+        keypoints = [kp for part, _ in parts for kp in part]
+        descriptors = [d for _, d in parts if d is not None]
+        return keypoints, np.concatenate(descriptors) if descriptors else None
+
+
+def pack_keypoints(keypoints, descriptors):
+    """Arrays holding keypoints and descriptors: positions, (size, angle, response) and octaves."""
+    n = len(keypoints)
+    arrays = dict(
+        points=np.array([kp.pt for kp in keypoints], np.float32).reshape(n, 2),
+        attrs=np.array([(kp.size, kp.angle, kp.response) for kp in keypoints], np.float32).reshape(n, 3),
+        octaves=np.array([kp.octave for kp in keypoints], np.int32),
+    )
+    if descriptors is None:
+        descriptors = np.empty((0, 0), np.uint8)
+    # SIFT descriptors are whole numbers in 0..255 stored as float32; a
+    # quarter of the bytes holds them exactly
+    small = descriptors.astype(np.uint8)
+    arrays["descriptors"] = small if np.array_equal(small, descriptors) else descriptors
+    return arrays
+
+
+def keypoint_geometry(keypoints):
+    """(N, 4) float32 rows of x, y, size and angle in degrees, the geometry a match implies."""
+    return np.array([(*kp.pt, kp.size, kp.angle) for kp in keypoints], np.float32).reshape(-1, 4)
+
+
+def unpack_keypoints(arrays):
+    """cv2.KeyPoint objects back from pack_keypoints arrays."""
+    return [cv2.KeyPoint(float(x), float(y), float(size), float(angle), float(response), int(octave))
+            for (x, y), (size, angle, response), octave
+            in zip(arrays["points"].tolist(), arrays["attrs"].tolist(), arrays["octaves"].tolist())]
+
+
+class SceneFeatures:
+    """Keypoints and descriptors of one page for one detector, computed at most once.
+
+    page is a PageCache. With image_path, the features are loaded from (or
+    saved to) a file beside that image keyed by the page's content hash;
+    a stale file of an older version of the page is replaced. A directory
+    that cannot be written only costs the persistence. Pages larger than
+    tile are detected by a TiledDetector; tile=None detects in one call.
+    """
+
+    def __init__(self, page, kind="sift", nfeatures=0, image_path=None, tile=TILE):
+        create_detector(kind)
+        self.page = page
+        self.kind = kind
+        self.nfeatures = nfeatures
+        self.image_path = image_path
+        self.tile = tile
+        # "disk" or "computed", and the seconds it took, once available
+        self.source = None
+        self.seconds = None
+        self._arrays = None
+        self._error = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Begin loading or detecting on a daemon thread; returns self."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"scene-{self.kind}", daemon=True)
+                self._thread.start()
+        return self
+
+    def ready(self):
+        return self._thread is not None and not self._thread.is_alive()
+
+    def get(self):
+        """(points, descriptors) of the page: an (N, 2) float32 array of keypoint positions and their descriptors.
+
+        Waits for the background work, starting it first if needed. SIFT
+        descriptors come back as float32 and ORB ones as uint8, as
+        detectAndCompute returns them; descriptors is None without keypoints.
+        """
+        arrays = self._wait()
+        descriptors = arrays["descriptors"]
+        if not len(arrays["points"]):
+            return arrays["points"], None
+        if self.kind == "sift":
+            descriptors = descriptors.astype(np.float32)
+        return arrays["points"], descriptors
+
+    def geometry(self):
+        """(geometry, descriptors) like get(), with keypoint_geometry rows instead of bare positions."""
+        arrays = self._wait()
+        _, descriptors = self.get()
+        return np.column_stack([arrays["points"], arrays["attrs"][:, :2]]), descriptors
+
+    def keypoints(self):
+        """The page keypoints as cv2.KeyPoint objects, for callers that need more than positions."""
+        return unpack_keypoints(self._wait())
+
+    def path(self):
+        """File the features are kept in, or None without an image_path."""
+        if self.image_path is None:
+            return None
+        key = content_hash(self.page.content_hash(),
+                           dict(nfeatures=self.nfeatures, tile=self.tile, overlap=OVERLAP, opencv=cv2.__version__))
+        return f"{self._stem()}{key[:16]}.npz"
+
+    def _stem(self):
+        folder, name = os.path.split(os.path.abspath(self.image_path))
+        tag = f"{self.kind}{self.nfeatures}" if self.nfeatures else self.kind
+        return os.path.join(folder, f".{name}.{tag}-")
+
+    def _wait(self):
+        self.start()
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._arrays
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            path = self.path()
+            self._arrays = _load(path) if path is not None else None
+            self.source = "disk"
+            if self._arrays is None:
+                detector = create_detector(self.kind, self.nfeatures, self.tile)
+                self._arrays = pack_keypoints(*detector.detectAndCompute(self.page.gray(), None))
+                self.source = "computed"
+                if path is not None:
+                    self._save(path)
+        except Exception as e:
+            self._error = e
+        self.seconds = time.perf_counter() - started
+
+    def _save(self, path):
+        try:
+            fd, tmp = tempfile.mkstemp(suffix=".npz.tmp", dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **self._arrays)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        for stale in glob.glob(glob.escape(self._stem()) + "*.npz"):
+            if stale != path:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+
+def _load(path):
+    try:
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+    except (FileNotFoundError, OSError, ValueError, KeyError):
+        return None
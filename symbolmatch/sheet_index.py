@@ -0,0 +1,247 @@
+"""Prebuilt on-disk descriptor index over every page of a project.
+
+build_index detects each page's keypoints once (through SceneFeatures, so
+the feature files beside the page images are reused), appends all
+descriptors to one raw file together with the page and position of every
+row, and builds a FLANN index over them: a forest of randomised KD-trees
+for SIFT, multi-probe LSH for binary ORB descriptors. SheetIndex.open
+memory-maps the descriptors and loads the saved index over them, so a
+session pays neither detection nor index building, and one query searches
+every sheet at once.
+
+A symbol usually repeats on a sheet and across sheets, so the second
+nearest descriptor is often another true instance and Lowe's ratio test
+would reject it. A query instead retrieves the KNN nearest descriptors and
+keeps those clearly closer than the farthest of them. Each kept match
+votes for where the template's origin would sit on its page; vote cells
+that gather enough votes are the candidate locations.
+
+    python -m symbolmatch.sheet_index build INDEX_DIR PAGE [PAGE ...]
+    python -m symbolmatch.sheet_index query INDEX_DIR TEMPLATE [--box x,y,w,h]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from symbolmatch.descriptor_match import KNN, repeated_matches
+from symbolmatch.page_cache import PageCache
+from symbolmatch.scene_features import SceneFeatures, create_detector
+
+INDEX_PARAMS = {
+    "sift": dict(algorithm=1, trees=5),
+    "orb": dict(algorithm=6, table_number=12, key_size=20, multi_probe_level=2),
+}
+# Leaves (KD) or buckets (LSH) visited per search; more is slower and more exact
+CHECKS = 64
+# A neighbour is kept when closer than this fraction of the farthest one
+RATIO = 0.75
+# Votes a location needs to be reported
+MIN_VOTES = 4
+MANIFEST = "manifest.json"
+
+Candidate = namedtuple("Candidate", "page box votes")
+
+
+def build_index(directory, page_paths, kind="sift", nfeatures=0, progress=None):
+    """Detect every page, write the index files into directory and return the opened SheetIndex.
+
+    progress(done, total) is called after each page. The manifest is
+    written last, so an interrupted build never opens as a complete index.
+    """
+    if kind not in INDEX_PARAMS:
+        raise ValueError(f"Unknown detector {kind!r}, expected one of {tuple(INDEX_PARAMS)}")
+    os.makedirs(directory, exist_ok=True)
+    page_paths = list(page_paths)
+    dtype = np.float32 if kind == "sift" else np.uint8
+    pages, points, page_ids, width = [], [], [], None
+    fd, raw = tempfile.mkstemp(suffix=".bin.tmp", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        for i, path in enumerate(page_paths):
+            gray_img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if gray_img is None:
+                raise FileNotFoundError(f"Could not read image: {path}")
+            page = PageCache(gray_img)
+            pts, des = SceneFeatures(page, kind, nfeatures, image_path=path).get()
+            pages.append(dict(path=os.path.abspath(path), hash=page.content_hash(), features=len(pts),
+                              shape=list(gray_img.shape[:2])))
+            if des is not None:
+                width = des.shape[1]
+                f.write(np.ascontiguousarray(des, dtype).tobytes())
+                points.append(pts)
+                page_ids.append(np.full(len(pts), i, np.int32))
+            if progress is not None:
+                progress(i + 1, len(page_paths))
+    rows = sum(len(p) for p in points)
+    if not rows:
+        os.remove(raw)
+        raise ValueError("No features found on any page")
+    os.replace(raw, os.path.join(directory, "descriptors.bin"))
+    _save_array(directory, "points.npy", np.concatenate(points))
+    _save_array(directory, "pages.npy", np.concatenate(page_ids))
+
+    descriptors = np.memmap(os.path.join(directory, "descriptors.bin"), dtype, "r", shape=(rows, width))
+    fd, tmp = tempfile.mkstemp(suffix=".flann.tmp", dir=directory)
+    os.close(fd)
+    cv2.flann_Index(descriptors, INDEX_PARAMS[kind]).save(tmp)
+    os.replace(tmp, os.path.join(directory, "index.flann"))
+
+    manifest = dict(kind=kind, nfeatures=nfeatures, rows=rows, width=width, dtype=np.dtype(dtype).str,
+                    index=INDEX_PARAMS[kind], opencv=cv2.__version__, pages=pages)
+    fd, tmp = tempfile.mkstemp(suffix=".json.tmp", dir=directory)
+    with os.fdopen(fd, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(directory, MANIFEST))
+    return SheetIndex.open(directory)
+
+
+class SheetIndex:
+    """Memory-mapped descriptors of many pages with the FLANN index built over them."""
+
+    def __init__(self, directory, manifest, descriptors, points, page_ids, flann):
+        self.directory = directory
+        self.manifest = manifest
+        self.kind = manifest["kind"]
+        self.pages = [p["path"] for p in manifest["pages"]]
+        # FLANN reads the descriptors in place, so they live as long as the index
+        self.descriptors = descriptors
+        self.points = points
+        self.page_ids = page_ids
+        self._flann = flann
+
+    @classmethod
+    def open(cls, directory):
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        descriptors = np.memmap(os.path.join(directory, "descriptors.bin"), np.dtype(manifest["dtype"]), "r",
+                                shape=(manifest["rows"], manifest["width"]))
+        points = np.load(os.path.join(directory, "points.npy"), mmap_mode="r")
+        page_ids = np.load(os.path.join(directory, "pages.npy"), mmap_mode="r")
+        flann = cv2.flann_Index()
+        if not flann.load(descriptors, os.path.join(directory, "index.flann")):
+            raise ValueError(f"Could not load the FLANN index in {directory}")
+        return cls(directory, manifest, descriptors, points, page_ids, flann)
+
+    def __len__(self):
+        return len(self.descriptors)
+
+    def search(self, descriptors, k=KNN, checks=CHECKS):
+        """(rows, distances): the k nearest indexed rows of every descriptor, nearest first.
+
+        Distances are Euclidean for SIFT and Hamming bit counts for ORB.
+        """
+        dtype = np.float32 if self.kind == "sift" else np.uint8
+        rows, distances = self._flann.knnSearch(np.ascontiguousarray(descriptors, dtype), min(k, len(self)),
+                                                params=dict(checks=checks))
+        distances = distances.astype(np.float32)
+        if self.kind == "sift":
+            # FLANN's KD-trees report squared distances
+            np.sqrt(distances, out=distances)
+        return rows, distances
+
+    def query(self, gray_template, ratio=RATIO, min_votes=MIN_VOTES, k=KNN, checks=CHECKS):
+        """Candidate(page, (x, y, w, h), votes) of gray_template on every indexed page, most votes first."""
+        keypoints, des = create_detector(self.kind, self.manifest["nfeatures"]).detectAndCompute(gray_template, None)
+        if des is None or len(keypoints) < 2:
+            return []
+        query_idx, rows = repeated_matches(*self.search(des, k, checks), ratio)
+        origins = self.points[rows] - cv2.KeyPoint_convert(keypoints)[query_idx]
+        return vote_locations(self.page_ids[rows], origins, gray_template.shape[:2], self.pages, min_votes)
+
+
+def vote_locations(page_ids, origins, template_shape, pages, min_votes=MIN_VOTES):
+    """Candidates from per-match template origins, one per cluster of at least min_votes votes.
+
+    Votes are counted in cells of half the template (see vote_clusters).
+    """
+    h, w = template_shape
+    candidates = []
+    for page, members, votes in vote_clusters(page_ids, origins, (max(1, w // 2), max(1, h // 2)), min_votes):
+        x, y = np.median(origins[members], axis=0)
+        candidates.append(Candidate(pages[page], (int(round(x)), int(round(y)), w, h), votes))
+    return candidates
+
+
+def vote_clusters(page_ids, positions, cell, min_votes=MIN_VOTES):
+    """(page, member indices, votes) of every cluster of voted positions, most votes first.
+
+    Votes are counted in cells of cell = (width, height) pixels; a cell's
+    score counts its 3x3 neighbourhood, and cells are accepted best first,
+    each claiming the neighbourhood so one instance is reported once.
+    """
+    if not len(positions):
+        return []
+    cells = np.floor(positions / np.asarray(cell, np.float32)).astype(np.int64)
+    keys, inverse, counts = np.unique(np.column_stack([page_ids, cells]), axis=0, return_inverse=True,
+                                      return_counts=True)
+    inverse = inverse.reshape(-1)
+    keys = [tuple(key) for key in keys.tolist()]
+    position = {key: i for i, key in enumerate(keys)}
+    votes = dict(zip(keys, counts.tolist()))
+    offsets = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+    score = {key: sum(votes.get((key[0], key[1] + dx, key[2] + dy), 0) for dx, dy in offsets) for key in votes}
+
+    clusters, claimed = [], set()
+    for key in sorted(score, key=score.get, reverse=True):
+        if score[key] < min_votes:
+            break
+        if key in claimed:
+            continue
+        page, cx, cy = key
+        near = [(page, cx + dx, cy + dy) for dx, dy in offsets]
+        claimed.update(near)
+        members = np.flatnonzero(np.isin(inverse, [position[k] for k in near if k in position]))
+        clusters.append((page, members, score[key]))
+    return clusters
+
+
+def _save_array(directory, name, array):
+    fd, tmp = tempfile.mkstemp(suffix=".npy.tmp", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, os.path.join(directory, name))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m symbolmatch.sheet_index",
+                                     description="Build or query a descriptor index over many pages.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index page images (rasterised sheets, see pdf-to-png)")
+    build.add_argument("directory")
+    build.add_argument("pages", nargs="+")
+    build.add_argument("--detector", choices=tuple(INDEX_PARAMS), default="sift")
+    build.add_argument("--nfeatures", type=int, default=0, help="feature budget per page (default: unlimited)")
+    query = commands.add_parser("query", help="find a template on every indexed page")
+    query.add_argument("directory")
+    query.add_argument("template")
+    query.add_argument("--box", help="x,y,w,h region of the template image to use")
+    query.add_argument("--min-votes", type=int, default=MIN_VOTES)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        index = build_index(args.directory, args.pages, args.detector, args.nfeatures,
+                            progress=lambda done, total: print(f"\rIndexed {done}/{total} pages", end="",
+                                                               file=sys.stderr))
+        print(f"\n{len(index)} {index.kind} descriptors from {len(index.pages)} pages", file=sys.stderr)
+        return 0
+
+    index = SheetIndex.open(args.directory)
+    gray_template = cv2.imread(args.template, cv2.IMREAD_GRAYSCALE)
+    if gray_template is None:
+        parser.error(f"Could not read image: {args.template}")
+    if args.box:
+        x, y, w, h = (int(v) for v in args.box.split(","))
+        gray_template = gray_template[y:y + h, x:x + w]
+    for candidate in index.query(gray_template, min_votes=args.min_votes):
+        x, y, w, h = candidate.box
+        print(json.dumps({"page": candidate.page, "x": x, "y": y, "w": w, "h": h, "votes": candidate.votes}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
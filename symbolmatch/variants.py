@@ -0,0 +1,129 @@
+"""Expand a template into its requested transforms and drop provably redundant ones.
+
+Two variants need only one full-page pass when either
+  * their pixels are identical after the geometric transform (symmetric
+    symbols rotate or flip onto themselves, and e.g. rot180 + hflip equals
+    vflip for every template), or
+  * they differ only by an intensity change the correlation method cancels:
+    TM_CCOEFF_NORMED ignores any positive gain and any offset, TM_CCORR_NORMED
+    any positive gain, and TM_CCOEFF any offset. This holds only while the
+    change does not clip at 0 or 255, which is checked per variant.
+"""
+import hashlib
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# Intensity changes each method's score is invariant to: (gain, offset)
+INVARIANCES = {
+    cv2.TM_CCOEFF_NORMED: (True, True),
+    cv2.TM_CCORR_NORMED: (True, False),
+    cv2.TM_CCOEFF: (False, True),
+}
+
+Transform = namedtuple("Transform", "scale rotation flip shade offset")
+Variant = namedtuple("Variant", "image transform aliases")
+
+
+class VariantPlan:
+    def __init__(self, variants, requested):
+        self.variants = variants
+        self.requested = requested
+
+    @property
+    def passes(self):
+        return len(self.variants)
+
+    @property
+    def saved(self):
+        return self.requested - self.passes
+
+    def summary(self):
+        return f"{self.passes} of {self.requested} variants need a full-page pass ({self.saved} saved)"
+
+
+def rotate(image, angle):
+    """Rotate clockwise by angle degrees, like rotate_template in the tutorials.
+
+    Right angles are exact; other angles expand the canvas to fit.
+    """
+    angle %= 360
+    if angle == 0:
+        return image
+    if angle == 90:
+        return cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+    if angle == 180:
+        return cv2.rotate(image, cv2.ROTATE_180)
+    if angle == 270:
+        return cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    h, w = image.shape[:2]
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), -angle, 1.0)
+    cos, sin = abs(m[0, 0]), abs(m[0, 1])
+    new_w, new_h = int(round(h * sin + w * cos)), int(round(h * cos + w * sin))
+    m[0, 2] += new_w / 2 - w / 2
+    m[1, 2] += new_h / 2 - h / 2
+    return cv2.warpAffine(image, m, (new_w, new_h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def flip(image, mode):
+    if mode is None:
+        return image
+    return cv2.flip(image, {"h": 1, "v": 0, "hv": -1}[mode])
+
+
+def geometric(template, scale, rotation, flip_mode):
+    image = template if scale == 1.0 else cv2.resize(template, None, fx=scale, fy=scale)
+    return flip(rotate(image, rotation), flip_mode)
+
+
+def _digest(image):
+    return hashlib.blake2b(repr(image.shape).encode() + np.ascontiguousarray(image).tobytes(),
+                           digest_size=16).hexdigest()
+
+
+def plan_variants(template, rotations=(0,), flips=(None,), scales=(1.0,), shades=(1.0,), offsets=(0,),
+                  method=cv2.TM_CCOEFF_NORMED):
+    """Expand template into every requested transform and group the equivalent ones.
+
+    Each returned Variant carries one representative image, its Transform,
+    and the aliases: every requested Transform whose scores it reproduces.
+    The representative is the member with the least intensity change, so it
+    loses the least to uint8 rounding.
+    """
+    gain_free, offset_free = INVARIANCES.get(method, (False, False))
+    groups = {}
+    requested = 0
+    lo, hi = float(template.min()), float(template.max())
+
+    for scale in scales:
+        for rotation in rotations:
+            for flip_mode in flips:
+                base = geometric(template, scale, rotation, flip_mode)
+                base_key = _digest(base)
+                for shade in shades:
+                    for offset in offsets:
+                        requested += 1
+                        transform = Transform(scale, rotation, flip_mode, shade, offset)
+                        clips = min(lo * shade, hi * shade) + offset < 0 or max(lo * shade, hi * shade) + offset > 255
+                        photometric_free = (
+                            not clips
+                            and (shade == 1.0 or (gain_free and shade > 0))
+                            and (offset == 0 or offset_free)
+                        )
+                        key = (base_key,) if photometric_free else (base_key, shade, offset)
+                        cost = abs(shade - 1.0) + abs(offset) / 255.0
+                        if key not in groups:
+                            groups[key] = [base, transform, [], cost]
+                        group = groups[key]
+                        group[2].append(transform)
+                        if cost < group[3]:
+                            group[1], group[3] = transform, cost
+
+    variants = []
+    for base, transform, aliases, _ in groups.values():
+        image = base
+        if transform.shade != 1.0 or transform.offset != 0:
+            image = np.clip(base.astype(np.float32) * transform.shade + transform.offset, 0, 255).astype(np.uint8)
+        variants.append(Variant(image, transform, aliases))
+    return VariantPlan(variants, requested)